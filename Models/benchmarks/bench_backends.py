@@ -0,0 +1,81 @@
+"""Benchmark: eager vs TorchScript vs ONNX Runtime for MC_CNN on CPU
+
+Export first (python export_model.py), then from the Models directory:
+    python benchmarks/bench_backends.py --threads 4 --batch-sizes 1,4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from density import build_mc_cnn
+from model_backends import create_backend
+
+
+def time_backend(backend, batch, iterations, warmup=2):
+    for _ in range(warmup):
+        backend(batch)
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        backend(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(latencies[len(latencies) // 2], 2),
+        'min_ms': round(latencies[0], 2),
+        'images_per_sec': round(batch.shape[0] * 1000 / (sum(latencies) / len(latencies)), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checkpoint', default='best_crowd_counting_model.pth')
+    parser.add_argument('--export-dir', default='exported')
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads())
+    parser.add_argument('--batch-sizes', default='1,4')
+    parser.add_argument('--size', default='1024x768', help='WIDTHxHEIGHT input size')
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    name = os.path.splitext(os.path.basename(args.checkpoint))[0]
+    paths = {
+        'eager': args.checkpoint,
+        'torchscript': os.path.join(args.export_dir, f'{name}.pt'),
+        'onnx': os.path.join(args.export_dir, f'{name}.onnx')
+    }
+
+    results = []
+    for backend_name, path in paths.items():
+        if not os.path.exists(path):
+            print(f"⚠️ Skipping {backend_name}: {path} not found", file=sys.stderr)
+            continue
+        try:
+            backend = create_backend(backend_name, path, build_mc_cnn)
+        except ImportError as e:
+            print(f"⚠️ Skipping {backend_name}: {e}", file=sys.stderr)
+            continue
+        for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+            batch = torch.rand(batch_size, 3, height, width)
+            results.append({'backend': backend_name, 'batch_size': batch_size, 'threads': args.threads,
+                            **time_backend(backend, batch, args.iterations)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'backend':>12} | {'batch':>5} | {'p50 ms':>8} | {'min ms':>8} | {'img/s':>7}")
+    for r in results:
+        print(f"{r['backend']:>12} | {r['batch_size']:>5} | {r['p50_ms']:>8.2f} | {r['min_ms']:>8.2f} | "
+              f"{r['images_per_sec']:>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
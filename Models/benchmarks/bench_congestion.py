@@ -0,0 +1,119 @@
+"""Micro-benchmark: legacy vs single-pass congestion analysis
+
+Run from the Models directory:
+    python benchmarks/bench_congestion.py --iterations 100
+
+Both paths use density.HEAT_MAP_CONFIG and produce the pure heat map plus
+the congestion statistics for the same synthetic density map.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from congestion import CongestionAnalysis
+from density import HEAT_MAP_CONFIG
+
+
+def legacy_heat_map(density_map):
+    """The original create_heat_map_overlay classification, without the resize/blend"""
+    if density_map.max() > 0:
+        normalized_density = density_map / density_map.max()
+    else:
+        normalized_density = density_map
+    heat_map = np.zeros((*density_map.shape, 3), dtype=np.uint8)
+    high_threshold = HEAT_MAP_CONFIG['high_threshold']
+    medium_threshold = HEAT_MAP_CONFIG['medium_threshold']
+    heat_map[normalized_density <= medium_threshold] = HEAT_MAP_CONFIG['colors']['low']
+    medium_mask = (normalized_density > medium_threshold) & (normalized_density <= high_threshold)
+    heat_map[medium_mask] = HEAT_MAP_CONFIG['colors']['medium']
+    heat_map[normalized_density > high_threshold] = HEAT_MAP_CONFIG['colors']['high']
+    return heat_map
+
+
+def legacy_stats(density_map):
+    """The original get_congestion_stats pixel classification"""
+    if density_map.max() > 0:
+        normalized_density = density_map / density_map.max()
+    else:
+        normalized_density = density_map
+    high_threshold = HEAT_MAP_CONFIG['high_threshold']
+    medium_threshold = HEAT_MAP_CONFIG['medium_threshold']
+    return (
+        int(np.sum(normalized_density <= medium_threshold)),
+        int(np.sum((normalized_density > medium_threshold) & (normalized_density <= high_threshold))),
+        int(np.sum(normalized_density > high_threshold)),
+        float(density_map.max()), float(density_map.mean()), float(density_map.sum())
+    )
+
+
+def legacy(density_map):
+    return legacy_heat_map(density_map), legacy_stats(density_map)
+
+
+def fused(density_map):
+    analysis = CongestionAnalysis(density_map, HEAT_MAP_CONFIG)
+    return analysis.heat_map(), analysis.stats(analysis.total_density)
+
+
+def time_ms(fn, density_map, iterations):
+    fn(density_map)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(density_map)
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def synthetic_density(height, width, rng):
+    """Smooth non-negative blobs, roughly the shape of a real crowd density map"""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    density = np.zeros((height, width), dtype=np.float32)
+    for cy, cx, sigma in zip(rng.uniform(0, height, 40), rng.uniform(0, width, 40), rng.uniform(4, 30, 40)):
+        density += np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * sigma ** 2))
+    return density * 0.01
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shapes', default='192x256,384x512,768x1024',
+                        help='comma separated HEIGHTxWIDTH density map shapes')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for shape in args.shapes.split(','):
+        height, width = (int(v) for v in shape.lower().split('x'))
+        density_map = synthetic_density(height, width, rng)
+
+        legacy_map, legacy_counts = legacy(density_map)
+        fused_map, fused_stats = fused(density_map)
+        fused_counts = (fused_stats['low_congestion_pixels'], fused_stats['medium_congestion_pixels'],
+                        fused_stats['high_congestion_pixels'])
+
+        results.append({
+            'shape': f'{height}x{width}',
+            'legacy_ms': round(time_ms(legacy, density_map, args.iterations), 3),
+            'fused_ms': round(time_ms(fused, density_map, args.iterations), 3),
+            'mismatched_pixels': int(np.any(legacy_map != fused_map, axis=-1).sum()),
+            'counts_match': tuple(legacy_counts[:3]) == fused_counts
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'shape':>10} | {'legacy ms':>9} | {'fused ms':>8} | {'speedup':>7} | {'mismatch px':>11}")
+    for r in results:
+        speedup = r['legacy_ms'] / max(r['fused_ms'], 1e-9)
+        print(f"{r['shape']:>10} | {r['legacy_ms']:>9.3f} | {r['fused_ms']:>8.3f} | {speedup:>6.2f}x | "
+              f"{r['mismatched_pixels']:>11}")
+
+
+if __name__ == '__main__':
+    main()
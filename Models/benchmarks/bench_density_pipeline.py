@@ -0,0 +1,132 @@
+"""Benchmark: per-stage latency of the crowd counting pipeline on synthetic crowd images
+
+Run from the Models directory:
+    python benchmarks/bench_density_pipeline.py --sizes 640x480,1920x1080 --iterations 20 --json
+
+Stages follow handle_prediction: decode the upload, preprocess, MC_CNN
+forward pass, congestion analysis, heat map overlay and base64 encoding.
+Without the checkpoint (or with --random-weights) MC_CNN runs with random
+weights, which costs the same.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import density
+from congestion import CongestionAnalysis
+from model_backends import EagerBackend
+from synthetic import encode_image, git_revision, parse_sizes, peak_rss_mb, percentiles, synthetic_crowd_image
+
+STAGES = ('decode', 'preprocess', 'inference', 'congestion', 'heat_map', 'encode', 'total')
+
+
+def load(args):
+    if args.random_weights or not os.path.exists(args.model):
+        print(f"⚠️ Using random MC_CNN weights ({args.model} not loaded)", file=sys.stderr)
+        density.model = EagerBackend(density.MC_CNN().to(density.device).eval(), density.device)
+    elif not density.load_model(args.model, args.backend, args.precision):
+        sys.exit(1)
+    density.BATCH_CONFIG['enabled'] = False
+    density.start_batcher()
+
+
+def run_once(data, resolution, image_format):
+    """One pass through the /predict stages; returns {stage: ms}"""
+    timings = {}
+    start = last = time.perf_counter()
+
+    def lap(stage):
+        nonlocal last
+        now = time.perf_counter()
+        timings[stage] = (now - last) * 1000
+        last = now
+
+    image = density.decode_image_bytes(data)
+    lap('decode')
+    size, tiled = density.working_size(image.shape[1], image.shape[0], resolution)
+    img_tensor, original = density.preprocess_image(image, target_size=size, gt_downsample=density.GT_DOWNSAMPLE,
+                                                    reuse_buffers=not tiled)
+    lap('preprocess')
+    density_map = density.predict_tiled(img_tensor) if tiled else density.run_model_batch([img_tensor])[0]
+    lap('inference')
+    analysis = CongestionAnalysis(density_map, density.HEAT_MAP_CONFIG)
+    analysis.stats(float(density_map.sum()))
+    lap('congestion')
+    overlay, _ = density.create_heat_map_overlay(original, density_map, analysis=analysis)
+    lap('heat_map')
+    density.image_to_base64(overlay, image_format)
+    lap('encode')
+    timings['total'] = (last - start) * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default='best_crowd_counting_model.pth')
+    parser.add_argument('--backend', choices=('eager', 'torchscript', 'onnx'), default=None)
+    parser.add_argument('--precision', choices=('fp32', 'channels_last', 'bf16'), default=None)
+    parser.add_argument('--random-weights', action='store_true', help='do not load the checkpoint')
+    parser.add_argument('--sizes', default='640x480,1024x768,1920x1080', help='comma separated WIDTHxHEIGHT')
+    parser.add_argument('--resolution', choices=density.RESOLUTION_MODES, default='fixed')
+    parser.add_argument('--format', choices=tuple(density.IMAGE_FORMATS), default='png')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads())
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    load(args)
+    rng = np.random.default_rng(0)
+
+    results = []
+    with torch.inference_mode():
+        for width, height in parse_sizes(args.sizes):
+            data = encode_image(synthetic_crowd_image(width, height, rng))
+            for _ in range(args.warmup):
+                run_once(data, args.resolution, args.format)
+            samples = {stage: [] for stage in STAGES}
+            for _ in range(args.iterations):
+                for stage, ms in run_once(data, args.resolution, args.format).items():
+                    samples[stage].append(ms)
+            total_s = sum(samples['total']) / 1000
+            results.append({
+                'size': f'{width}x{height}',
+                'upload_bytes': len(data),
+                'stages': {stage: percentiles(samples[stage]) for stage in STAGES},
+                'images_per_sec': round(args.iterations / total_s, 2) if total_s else None
+            })
+
+    report = {
+        'benchmark': 'density_pipeline',
+        'git_revision': git_revision(),
+        'backend': density.model.name,
+        'threads': args.threads,
+        'resolution': args.resolution,
+        'format': args.format,
+        'results': results,
+        'peak_rss_mb': peak_rss_mb()
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'size':>10} | " + ' | '.join(f'{stage:>10}' for stage in STAGES) + " | img/s")
+    for r in results:
+        print(f"{r['size']:>10} | " + ' | '.join(f"{r['stages'][stage]['p50_ms']:>10.2f}" for stage in STAGES)
+              + f" | {r['images_per_sec']:.2f}")
+    print(f"(p50 ms per stage; peak RSS {report['peak_rss_mb']} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Micro-benchmark: frame decode and annotation, allocating vs buffer-reusing paths
+
+Run from the Models directory:
+    python benchmarks/bench_frames.py --frames 300
+
+Two stages are measured at 640x480 and 1080p on a synthetic MJPEG clip:
+
+- decode: camera_streams.VideoStream reading into its frame ring
+  (ring_size=4) vs a fresh array per frame (ring_size=0)
+- annotate: the per-frame work of the palm detector around MediaPipe
+  (colour conversion, warning overlay, JPEG encode) as it was before -
+  copy, full-frame overlay blend, PIL encode, kept here as a local copy - vs
+  PalmDetectionAPI's own detect() buffers, draw_detection_overlay() and
+  frame_to_base64(). MediaPipe itself is replaced by a stub that finds no
+  hands (mediapipe must still be importable).
+
+Allocation figures are tracemalloc peaks above the steady state, which
+include NumPy/OpenCV array buffers.
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_streams import VideoStream
+from palm_detection_api import PalmDetectionAPI
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+WARNING_COLOR = (0, 100, 255)
+WARNING_TEXT = "PALM DETECTED!"
+
+
+def write_clip(path, width, height, frames, rng):
+    """Synthetic MJPEG clip: noise background with a moving bright square"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    size = height // 4
+    for i in range(frames):
+        frame = background.copy()
+        x = (i * 7) % (width - size)
+        frame[height // 3:height // 3 + size, x:x + size] = 255
+        writer.write(frame)
+    writer.release()
+
+
+def bench_decode(path, ring_size, frames):
+    stream = VideoStream(path, ring_size=ring_size)
+    stream.cap = cv2.VideoCapture(path)
+    ret, frame = stream.read_into_ring()
+    stream.publish(frame)
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    decoded = 0
+    start = time.perf_counter()
+    while decoded < frames:
+        ret, frame = stream.read_into_ring()
+        if not ret:
+            break
+        stream.publish(frame)
+        decoded += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stream.cap.release()
+    return {
+        'fps': round(decoded / elapsed, 1) if elapsed else 0.0,
+        'peak_alloc_kb': round((peak - baseline) / 1024, 1),
+        'frames': decoded
+    }
+
+
+def legacy_overlay(frame, count):
+    height, width = frame.shape[:2]
+    overlay = frame.copy()
+    cv2.rectangle(overlay, (0, 0), (width, 80), WARNING_COLOR, -1)
+    cv2.putText(overlay, WARNING_TEXT, (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+    cv2.putText(overlay, f"Detections: {count}", (20, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    return cv2.addWeighted(overlay, 0.8, frame, 0.2, 0)
+
+
+def legacy_encode(frame):
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if Image is None:
+        ok, buffer = cv2.imencode('.jpg', cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, 85])
+        return base64.b64encode(buffer).decode('utf-8')
+    out = io.BytesIO()
+    Image.fromarray(rgb).save(out, format='JPEG', quality=85)
+    return base64.b64encode(out.getvalue()).decode('utf-8')
+
+
+class LegacyPath:
+    """frame.copy() -> RGB copy for MediaPipe -> overlay on a full copy -> PIL JPEG"""
+
+    def __call__(self, frame):
+        working = frame.copy()
+        rgb = cv2.cvtColor(working, cv2.COLOR_BGR2RGB)
+        working = legacy_overlay(working, 1)
+        return rgb, legacy_encode(working)
+
+
+class NoHands:
+    """Stands in for MediaPipe Hands: every frame comes back without hands"""
+    results = SimpleNamespace(multi_hand_landmarks=None)
+
+    def process(self, image):
+        return self.results
+
+
+class ReusedPath:
+    """The production path: PalmDetectionAPI.detect() buffers, annotate() with the banner overlay, render_jpeg()"""
+
+    def __init__(self):
+        self.detector = PalmDetectionAPI()
+        self.detector.hands = NoHands()
+
+    def __call__(self, frame):
+        self.detector.detect(frame)
+        # One open palm, so annotate() draws the warning banner as it does for a detection
+        height, width = frame.shape[:2]
+        self.detector.last_palm_boxes = [[width // 4, height // 4, width // 2, height // 2]]
+        return self.detector.rgb_buffer, self.detector.render_jpeg(1)
+
+
+def bench_annotate(path_fn, frame, iterations):
+    path_fn(frame)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        path_fn(frame)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'ms': round(elapsed * 1000 / iterations, 3),
+        'peak_alloc_kb': round((peak - baseline) / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='640x480,1920x1080', help='comma separated WIDTHxHEIGHT frame sizes')
+    parser.add_argument('--frames', type=int, default=300, help='frames decoded per run')
+    parser.add_argument('--iterations', type=int, default=100, help='annotation iterations per run')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes.split(','):
+            width, height = (int(v) for v in size.lower().split('x'))
+            path = os.path.join(tmp, f'clip_{width}x{height}.avi')
+            write_clip(path, width, height, args.frames + 1, rng)
+
+            frame = cv2.VideoCapture(path).read()[1]
+            results.append({
+                'size': f'{width}x{height}',
+                'decode_alloc': bench_decode(path, 0, args.frames),
+                'decode_ring': bench_decode(path, 4, args.frames),
+                'annotate_legacy': bench_annotate(LegacyPath(), frame, args.iterations),
+                'annotate_reused': bench_annotate(ReusedPath(), frame, args.iterations)
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'size':>10} | {'stage':>8} | {'allocating':>22} | {'reusing':>22}")
+    for r in results:
+        print(f"{r['size']:>10} | {'decode':>8} | {r['decode_alloc']['fps']:>8.1f} fps "
+              f"{r['decode_alloc']['peak_alloc_kb']:>7.0f} KB | {r['decode_ring']['fps']:>8.1f} fps "
+              f"{r['decode_ring']['peak_alloc_kb']:>7.0f} KB")
+        print(f"{r['size']:>10} | {'annotate':>8} | {r['annotate_legacy']['ms']:>8.3f} ms "
+              f"{r['annotate_legacy']['peak_alloc_kb']:>7.0f} KB | {r['annotate_reused']['ms']:>8.3f} ms "
+              f"{r['annotate_reused']['peak_alloc_kb']:>7.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
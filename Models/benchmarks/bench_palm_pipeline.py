@@ -0,0 +1,128 @@
+"""Benchmark: per-stage latency and frames/sec of the palm detection pipeline
+
+Run from the Models directory:
+    python benchmarks/bench_palm_pipeline.py --frames 200 --json
+
+A synthetic MJPEG clip (or --video) stands in for the IP camera: it is read
+through camera_streams.VideoStream like a real stream. Stages are the
+shared-frame read, detect() (colour conversion + MediaPipe), annotate() and
+JPEG encoding; --seconds also runs detect_palm_from_ip end to end and
+reports frames read/inferred per second for each sampler.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_streams import VideoStream
+from frame_sampling import SAMPLERS
+from palm_detection_api import PalmDetectionAPI
+from synthetic import git_revision, parse_sizes, peak_rss_mb, percentiles, write_synthetic_video
+
+STAGES = ('read', 'detect', 'annotate', 'encode')
+
+
+def bench_stages(detector, source, frames):
+    stream = VideoStream(source).start()
+    samples = {stage: [] for stage in STAGES}
+    try:
+        if not stream.wait_connected(10.0):
+            raise RuntimeError(f'Could not read from {source}')
+        last_id = 0
+        while len(samples['detect']) < frames:
+            start = time.perf_counter()
+            last_id, frame = stream.read(last_id, timeout=2.0)
+            if frame is None:
+                continue
+            t_read = time.perf_counter()
+            result = detector.detect(frame, lambda: stream.frame_valid(last_id))
+            if result is None:
+                continue
+            t_detect = time.perf_counter()
+            annotated = detector.annotate(result['detection_count'])
+            t_annotate = time.perf_counter()
+            detector.frame_to_base64(annotated)
+            t_encode = time.perf_counter()
+
+            samples['read'].append((t_read - start) * 1000)
+            samples['detect'].append((t_detect - t_read) * 1000)
+            samples['annotate'].append((t_annotate - t_detect) * 1000)
+            samples['encode'].append((t_encode - t_annotate) * 1000)
+    finally:
+        stream.stop()
+    return {stage: percentiles(values) for stage, values in samples.items()}
+
+
+def bench_end_to_end(detector, source, seconds, sampling):
+    start = time.perf_counter()
+    result = asyncio.run(detector.detect_palm_from_ip(source, timeout=seconds, sampling=sampling))
+    # Palms in the footage end the call early, so rates use the elapsed time (including connecting)
+    elapsed = time.perf_counter() - start
+    if not result['success']:
+        return {'error': result['message']}
+    return {
+        'frames_read': result.get('frames_read'),
+        'frames_inferred': result.get('frames_inferred'),
+        'read_fps': round(result['frames_read'] / elapsed, 1) if elapsed else None,
+        'inferred_fps': round(result['frames_inferred'] / elapsed, 1) if elapsed else None,
+        'palm_detected': result['palm_detected']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--video', help='video file or stream URL (default: a synthetic clip per --sizes)')
+    parser.add_argument('--sizes', default='640x480,1280x720', help='synthetic clip sizes, WIDTHxHEIGHT')
+    parser.add_argument('--frames', type=int, default=200, help='frames timed per stage')
+    parser.add_argument('--seconds', type=float, default=5.0, help='end-to-end run per sampler (0 to skip)')
+    parser.add_argument('--sensitivity', type=float, default=0.7)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+
+    detector = PalmDetectionAPI(args.sensitivity)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.video:
+            sources = [(args.video, args.video)]
+        else:
+            sources = [(f'{w}x{h}', write_synthetic_video(os.path.join(tmp, f'camera_{w}x{h}.avi'), w, h))
+                       for w, h in parse_sizes(args.sizes)]
+
+        for label, source in sources:
+            entry = {'source': label, 'stages': bench_stages(detector, source, args.frames)}
+            detect_s = entry['stages']['detect']['mean_ms'] / 1000
+            entry['max_detect_fps'] = round(1 / detect_s, 1) if detect_s else None
+            if args.seconds > 0:
+                entry['end_to_end'] = {sampling: bench_end_to_end(detector, source, args.seconds, sampling)
+                                       for sampling in SAMPLERS}
+            results.append(entry)
+
+    report = {
+        'benchmark': 'palm_pipeline',
+        'git_revision': git_revision(),
+        'results': results,
+        'peak_rss_mb': peak_rss_mb()
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'source':>12} | " + ' | '.join(f'{stage:>9}' for stage in STAGES) + " | detect fps")
+    for r in results:
+        print(f"{r['source']:>12} | " + ' | '.join(f"{r['stages'][stage]['p50_ms']:>9.2f}" for stage in STAGES)
+              + f" | {r['max_detect_fps']}")
+        for sampling, e2e in r.get('end_to_end', {}).items():
+            print(f"{'':>12}   {sampling}: {e2e}")
+    print(f"(p50 ms per stage; peak RSS {report['peak_rss_mb']} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Micro-benchmark: legacy vs lean preprocess_image
+
+Run from the Models directory:
+    python benchmarks/bench_preprocess.py --iterations 50
+
+Allocation counts are the Python/NumPy-side blocks seen by tracemalloc
+(OpenCV and torch allocate outside of it), so treat them as a relative
+measure of temporaries per image rather than an absolute total.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from density import preprocess_image
+
+
+def legacy_preprocess(img, target_size=(1024, 768), gt_downsample=4):
+    """The original preprocess_image body, kept here as the baseline"""
+    original_img = img.copy()
+    if target_size:
+        img = cv2.resize(img, target_size)
+    ds_rows = int(img.shape[0] // gt_downsample)
+    ds_cols = int(img.shape[1] // gt_downsample)
+    img = cv2.resize(img, (ds_cols * gt_downsample, ds_rows * gt_downsample))
+    img = img.transpose((2, 0, 1))
+    img_tensor = torch.tensor(img / 255.0, dtype=torch.float).unsqueeze(0)
+    return img_tensor, original_img
+
+
+def lean_preprocess(img):
+    return preprocess_image(img)
+
+
+def measure(fn, img, iterations):
+    fn(img)  # warm up buffers and caches
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(img)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn(img)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'lineno')
+    allocations = sum(max(stat.count_diff, 0) for stat in stats)
+    return {
+        'ms_per_image': round(elapsed_ms, 3),
+        'allocations_per_image': allocations,
+        'peak_traced_mb': round(peak / 1024 / 1024, 2)
+    }
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='640x480,1920x1080,3840x2160',
+                        help='comma separated WIDTHxHEIGHT input sizes')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    rng = np.random.default_rng(0)
+    results = []
+    for size in args.sizes.split(','):
+        width, height = parse_size(size)
+        img = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+        legacy_tensor, _ = legacy_preprocess(img)
+        lean_tensor, _ = lean_preprocess(img)
+        max_diff = float((legacy_tensor - lean_tensor).abs().max())
+
+        results.append({
+            'size': f'{width}x{height}',
+            'legacy': measure(legacy_preprocess, img, args.iterations),
+            'lean': measure(lean_preprocess, img, args.iterations),
+            'max_abs_diff': max_diff
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'size':>10} | {'legacy ms':>9} {'allocs':>6} | {'lean ms':>9} {'allocs':>6} | {'speedup':>7}")
+    for r in results:
+        speedup = r['legacy']['ms_per_image'] / max(r['lean']['ms_per_image'], 1e-9)
+        print(f"{r['size']:>10} | {r['legacy']['ms_per_image']:>9.3f} {r['legacy']['allocations_per_image']:>6} | "
+              f"{r['lean']['ms_per_image']:>9.3f} {r['lean']['allocations_per_image']:>6} | {speedup:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Load test: concurrent HTTP clients against a running density or palm detection server
+
+Start the server first, then from the Models directory:
+    python benchmarks/load_test.py density --url http://localhost:3000 --concurrency 8 --requests 200
+    python benchmarks/load_test.py palm --url http://localhost:8000 --concurrency 4 --requests 20
+
+density posts synthetic crowd images to /predict (or --endpoint); palm posts
+/detect-palm requests against a synthetic video file, which the server opens
+like a camera URL (so it must run on this machine, or pass --camera). Reports
+p50/p95/p99 latency, throughput, status codes and, with --server-pid, the
+server's peak RSS.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from synthetic import (encode_image, git_revision, parse_sizes, peak_rss_mb, percentiles, synthetic_crowd_image,
+                       write_synthetic_video)
+
+
+def multipart_body(fields, files):
+    """multipart/form-data body for urllib: fields {name: value}, files {name: (filename, bytes, mimetype)}"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, data, mimetype) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: {mimetype}\r\n\r\n'.encode() + data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def density_requests(args):
+    """Request factories cycling through synthetic uploads of each size"""
+    rng = np.random.default_rng(0)
+    fields = dict(field.split('=', 1) for field in args.field)
+    bodies = []
+    for width, height in parse_sizes(args.sizes):
+        data = encode_image(synthetic_crowd_image(width, height, rng))
+        bodies.append(multipart_body(fields, {'image': (f'crowd_{width}x{height}.jpg', data, 'image/jpeg')}))
+    url = args.url.rstrip('/') + (args.endpoint or '/predict')
+    return [lambda body=body, content_type=content_type: urllib.request.Request(
+        url, data=body, headers={'Content-Type': content_type}, method='POST') for body, content_type in bodies]
+
+
+def palm_requests(args, camera):
+    payload = json.dumps({
+        'ip_address': camera,
+        'timeout': args.palm_timeout,
+        'sampling': args.sampling
+    }).encode()
+    url = args.url.rstrip('/') + (args.endpoint or '/detect-palm')
+    return [lambda: urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'},
+                                           method='POST')]
+
+
+def run_load(factories, total, concurrency, timeout):
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(i):
+        request = factories[i % len(factories)]()
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception as e:
+            status = type(e).__name__
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - start
+    return {
+        'latency': percentiles(latencies),
+        'statuses': statuses,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('target', choices=('density', 'palm'))
+    parser.add_argument('--url', default=None, help='server base URL (default: :3000 for density, :8000 for palm)')
+    parser.add_argument('--endpoint', help='override the endpoint path (/predict, /predict/count, /detect-palm, ...)')
+    parser.add_argument('--concurrency', default='1,4,8', help='comma separated client counts to sweep')
+    parser.add_argument('--requests', type=int, default=100, help='requests per concurrency level')
+    parser.add_argument('--timeout', type=float, default=120.0, help='per-request timeout in seconds')
+    parser.add_argument('--sizes', default='640x480,1920x1080', help='density: synthetic upload sizes')
+    parser.add_argument('--field', action='append', default=[], help='density: extra form field, e.g. mode=count_only')
+    parser.add_argument('--camera', help='palm: camera URL or video path (default: a synthetic clip)')
+    parser.add_argument('--palm-timeout', type=int, default=3, help='palm: monitoring time per request')
+    parser.add_argument('--sampling', default='adaptive', help='palm: frame sampler')
+    parser.add_argument('--server-pid', type=int, help='report this process\'s peak RSS (Linux)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    args = parser.parse_args()
+    args.url = args.url or ('http://localhost:3000' if args.target == 'density' else 'http://localhost:8000')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.target == 'density':
+            factories = density_requests(args)
+        else:
+            camera = args.camera or write_synthetic_video(os.path.join(tmp, 'camera.avi'))
+            factories = palm_requests(args, camera)
+
+        runs = []
+        for concurrency in (int(c) for c in args.concurrency.split(',')):
+            runs.append({'concurrency': concurrency, 'requests': args.requests,
+                         **run_load(factories, args.requests, concurrency, args.timeout)})
+
+    report = {
+        'benchmark': f'load_{args.target}',
+        'git_revision': git_revision(),
+        'url': args.url + (args.endpoint or ('/predict' if args.target == 'density' else '/detect-palm')),
+        'runs': runs,
+        'server_peak_rss_mb': peak_rss_mb(args.server_pid) if args.server_pid else None,
+        'client_peak_rss_mb': peak_rss_mb()
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'clients':>7} | {'p50 ms':>9} | {'p95 ms':>9} | {'p99 ms':>9} | {'req/s':>7} | statuses")
+    for run in runs:
+        latency = run['latency']
+        if not latency['count']:
+            print(f"{run['concurrency']:>7} | {'-':>9} | {'-':>9} | {'-':>9} | {0:>7.2f} | {run['statuses']}")
+            continue
+        print(f"{run['concurrency']:>7} | {latency['p50_ms']:>9.1f} | {latency['p95_ms']:>9.1f} | "
+              f"{latency['p99_ms']:>9.1f} | {run['throughput_rps']:>7.2f} | {run['statuses']}")
+    if report['server_peak_rss_mb'] is not None:
+        print(f"Server peak RSS: {report['server_peak_rss_mb']} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Shared helpers for the benchmark suite: synthetic inputs and latency/memory summaries"""
+import os
+import resource
+import subprocess
+import sys
+
+import cv2
+import numpy as np
+
+
+def parse_sizes(text):
+    """'640x480,1920x1080' -> [(640, 480), (1920, 1080)]"""
+    return [tuple(int(v) for v in size.lower().split('x')) for size in text.split(',') if size.strip()]
+
+
+def synthetic_crowd_image(width, height, rng, people=None):
+    """RGB street-like scene with `people` head/shoulder blobs, denser towards the top (farther away)"""
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = (110, 110, 115)
+    # Low-frequency texture so the scene is not flat
+    noise = rng.integers(0, 40, (height // 8 + 1, width // 8 + 1), dtype=np.uint8)
+    image += cv2.resize(noise, (width, height), interpolation=cv2.INTER_LINEAR)[..., None]
+
+    people = people or max(20, width * height // 4000)
+    ys = (rng.power(2.0, people) * height).astype(int)
+    xs = rng.integers(0, width, people)
+    for x, y in zip(xs, ys):
+        scale = 0.3 + 0.7 * y / height  # perspective: nearer people are larger
+        radius = max(2, int(min(width, height) * 0.012 * scale))
+        color = tuple(int(c) for c in rng.integers(20, 235, 3))
+        cv2.ellipse(image, (int(x), int(y + 2 * radius)), (2 * radius, 3 * radius), 0, 180, 360, color, -1)
+        cv2.circle(image, (int(x), int(y)), radius, (int(rng.integers(60, 200)),) * 3, -1)
+    return image
+
+
+def encode_image(image, ext='.jpg', quality=90):
+    """RGB image -> encoded bytes, as a client would upload it"""
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext in ('.jpg', '.jpeg') else []
+    ok, buffer = cv2.imencode(ext, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise RuntimeError(f'Could not encode {ext}')
+    return buffer.tobytes()
+
+
+def write_synthetic_video(path, width=640, height=480, seconds=10, fps=30, rng=None):
+    """File-backed stand-in for an IP camera: textured background with a moving skin-toned 'hand'
+
+    VideoStream reopens a source that ends, so the clip loops like a live camera
+    (decoded as fast as the reader allows rather than at `fps`).
+    """
+    rng = rng or np.random.default_rng(0)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f'Could not open video writer for {path}')
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    size = height // 5
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        x = int((width - size) * (0.5 + 0.4 * np.sin(i / fps)))
+        y = int((height - size) * (0.5 + 0.3 * np.cos(i / fps)))
+        cv2.ellipse(frame, (x + size // 2, y + size // 2), (size // 3, size // 2), 0, 0, 360, (120, 160, 215), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def percentiles(latencies_ms):
+    """p50/p95/p99/mean/max summary of a list of latencies in milliseconds"""
+    if not latencies_ms:
+        return {'count': 0}
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': int(values.size),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(values.mean()), 3),
+        'max_ms': round(float(values.max()), 3)
+    }
+
+
+def peak_rss_mb(pid=None):
+    """Peak resident set size of this process, or of another process (Linux /proc VmHWM)"""
+    if pid is None:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        return round(usage / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_revision():
+    """Current commit, so JSON results can be compared across commits"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,339 @@
+import asyncio
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class VideoStream:
+    """One reader thread per camera URL that broadcasts the latest frame
+
+    Frames are published with an increasing frame id; every subscriber waits
+    for an id newer than the last one it saw, so any number of clients share
+    a single camera connection. Lost connections are retried with
+    exponential backoff. Published frames are shared and must not be
+    modified in place by readers.
+
+    Frames are decoded into a ring of `ring_size` preallocated buffers that
+    the reader thread reuses, so steady-state streaming allocates nothing.
+    A buffer is rewritten ring_size - 1 frames after it was published;
+    readers that copy out of a frame confirm afterwards with frame_valid()
+    that it was not overwritten meanwhile. ring_size=0 allocates every frame.
+
+    Threads wait on a Condition; coroutines use wait_connected_async() and
+    read_async(), which the reader thread wakes through their event loop,
+    so waiting on a camera never holds an executor thread.
+    """
+    def __init__(self, src, reconnect_delay=0.5, max_reconnect_delay=10.0, ring_size=4):
+        self.src = src
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.ring_size = ring_size if ring_size >= 2 else 0
+
+        self.cap = None
+        self.ring = []
+        self.slot_ids = []
+        self.slot = -1
+        self.frame = None
+        self.frame_id = 0
+        self.frames_read = 0
+        self.frames_dropped = 0  # frames overwritten while subscribed before any subscriber read them
+        self.frame_consumed = True  # whether a subscriber has read the current frame
+        self.subscribers = 0  # maintained by StreamRegistry
+        self.reconnects = 0
+        self.connected = False
+        self.running = False
+
+        self.cond = threading.Condition()
+        self.waiters = set()  # (event loop, asyncio.Event) of coroutines waiting on cond
+        self.stop_event = threading.Event()
+
+    def open(self):
+        cap = cv2.VideoCapture(self.src)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        cap.set(cv2.CAP_PROP_FPS, 30)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        return cap
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.update, name=f'video-stream:{self.src}', daemon=True)
+        self.thread.start()
+        return self
+
+    def update(self):
+        delay = self.reconnect_delay
+        while self.running:
+            if self.cap is None:
+                self.cap = self.open()
+                if not self.cap.isOpened():
+                    self.disconnect()
+                    self.stop_event.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+
+            ret, frame = self.read_into_ring()
+            if not ret:
+                # Camera dropped: back off and reconnect
+                self.disconnect()
+                self.reconnects += 1
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            delay = self.reconnect_delay
+            self.publish(frame)
+
+    def read_into_ring(self):
+        """cap.read() that decodes into the next ring buffer instead of a new array"""
+        if not self.cap.grab():
+            return False, None
+        if not self.ring:
+            ret, frame = self.cap.retrieve()
+            if ret and self.ring_size:
+                self.ring = [frame] + [np.empty_like(frame) for _ in range(self.ring_size - 1)]
+                self.slot_ids = [0] * self.ring_size
+                self.slot = -1
+            return ret, frame
+
+        slot = (self.slot + 1) % self.ring_size
+        # Invalidate the slot before overwriting it so concurrent readers can tell
+        self.slot_ids[slot] = -1
+        ret, frame = self.cap.retrieve(self.ring[slot])
+        if ret and frame is not self.ring[slot]:
+            # Resolution changed: OpenCV allocated a new array, rebuild the ring around it
+            self.ring = [frame] + [np.empty_like(frame) for _ in range(self.ring_size - 1)]
+            self.slot_ids = [0] * self.ring_size
+            self.slot = -1
+        return ret, frame
+
+    def frame_valid(self, frame_id):
+        """Whether the frame published as frame_id has not been overwritten by the reader"""
+        return not self.ring_size or frame_id in self.slot_ids
+
+    def publish(self, frame):
+        with self.cond:
+            if self.ring_size:
+                self.slot = (self.slot + 1) % self.ring_size
+                self.slot_ids[self.slot] = self.frame_id + 1
+            if self.subscribers and not self.frame_consumed:
+                self.frames_dropped += 1
+            self.frame = frame
+            self.frame_consumed = False
+            self.frame_id += 1
+            self.frames_read += 1
+            self.connected = True
+            self.notify()
+
+    def disconnect(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        with self.cond:
+            self.connected = False
+            self.notify()
+
+    def notify(self):
+        """Wake threads and coroutines waiting on cond (called with cond held)"""
+        self.cond.notify_all()
+        for loop, event in self.waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+
+    async def wait_for_async(self, predicate, timeout):
+        """Coroutine version of cond.wait_for(predicate, timeout)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        waiter = (loop, asyncio.Event())
+        with self.cond:
+            self.waiters.add(waiter)
+        try:
+            while True:
+                with self.cond:
+                    # Cleared under the lock, so a publish after the check always sets it again
+                    waiter[1].clear()
+                    if predicate():
+                        return True
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self.cond:
+                self.waiters.discard(waiter)
+
+    def wait_connected(self, timeout):
+        """Block until the first frame arrives; returns whether the camera is connected"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.frame_id > 0 or not self.running, timeout=timeout)
+            return self.frame_id > 0 and self.connected
+
+    async def wait_connected_async(self, timeout):
+        await self.wait_for_async(lambda: self.frame_id > 0 or not self.running, timeout)
+        with self.cond:
+            return self.frame_id > 0 and self.connected
+
+    def read(self, after_id=0, timeout=1.0):
+        """Wait for a frame newer than after_id; returns (frame_id, frame) or (after_id, None) on timeout"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.frame_id > after_id or not self.running, timeout=timeout):
+                return after_id, None
+            return self.latest(after_id)
+
+    async def read_async(self, after_id=0, timeout=1.0):
+        """read() for coroutines"""
+        if not await self.wait_for_async(lambda: self.frame_id > after_id or not self.running, timeout):
+            return after_id, None
+        with self.cond:
+            return self.latest(after_id)
+
+    def latest(self, after_id):
+        """(frame_id, frame) of the newest frame if newer than after_id (called with cond held)"""
+        if self.frame_id <= after_id:
+            return after_id, None
+        self.frame_consumed = True
+        return self.frame_id, self.frame
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        with self.cond:
+            self.notify()
+        if hasattr(self, 'thread'):
+            self.thread.join(timeout=5.0)
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class StreamSubscription:
+    """A client's view of a shared VideoStream; remembers the last frame it consumed"""
+    def __init__(self, registry, stream):
+        self.registry = registry
+        self.stream = stream
+        self.last_id = 0
+        self.closed = False
+
+    @property
+    def connected(self):
+        return self.stream.connected
+
+    def wait_connected(self, timeout):
+        return self.stream.wait_connected(timeout)
+
+    async def wait_connected_async(self, timeout):
+        return await self.stream.wait_connected_async(timeout)
+
+    def read(self, timeout=1.0):
+        """Next unseen frame, or None on timeout"""
+        frame_id, frame = self.stream.read(self.last_id, timeout)
+        if frame is not None:
+            self.last_id = frame_id
+        return frame
+
+    async def read_async(self, timeout=1.0):
+        """read() for coroutines: waits on the event loop instead of an executor thread"""
+        frame_id, frame = await self.stream.read_async(self.last_id, timeout)
+        if frame is not None:
+            self.last_id = frame_id
+        return frame
+
+    def validator(self):
+        """Callable telling whether the frame last returned by read() is still intact"""
+        frame_id = self.last_id
+        return lambda: self.stream.frame_valid(frame_id)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.registry.release(self.stream.src)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamRegistry:
+    """Reference-counted VideoStreams keyed by camera URL, closed after an idle grace period"""
+    def __init__(self, idle_timeout=30.0):
+        self.idle_timeout = idle_timeout
+        self.streams = {}  # src -> [stream, refcount]
+        self.lock = threading.Lock()
+        # Counters of streams that have been closed, so totals() never goes backwards
+        self.closed_totals = {'frames_read': 0, 'frames_dropped': 0, 'reconnects': 0}
+
+    def subscribe(self, src):
+        with self.lock:
+            entry = self.streams.get(src)
+            if entry is None:
+                entry = self.streams[src] = [VideoStream(src).start(), 0]
+            entry[1] += 1
+            entry[0].subscribers = entry[1]
+            return StreamSubscription(self, entry[0])
+
+    def release(self, src):
+        with self.lock:
+            entry = self.streams.get(src)
+            if entry is None:
+                return
+            entry[1] -= 1
+            entry[0].subscribers = entry[1]
+            if entry[1] > 0:
+                return
+            stream = entry[0]
+        timer = threading.Timer(self.idle_timeout, self.close_if_idle, args=(src, stream))
+        timer.daemon = True
+        timer.start()
+
+    def close_if_idle(self, src, stream):
+        with self.lock:
+            entry = self.streams.get(src)
+            if entry is None or entry[0] is not stream or entry[1] > 0:
+                return
+            del self.streams[src]
+            self.add_closed(stream)
+        stream.stop()
+
+    def add_closed(self, stream):
+        for name in self.closed_totals:
+            self.closed_totals[name] += getattr(stream, name)
+
+    def totals(self):
+        """Frames read / dropped and reconnects summed over every stream ever opened"""
+        with self.lock:
+            totals = dict(self.closed_totals)
+            for stream, _ in self.streams.values():
+                for name in totals:
+                    totals[name] += getattr(stream, name)
+            return totals
+
+    def stats(self):
+        with self.lock:
+            return {
+                src: {
+                    'subscribers': refcount,
+                    'connected': stream.connected,
+                    'frames_read': stream.frames_read,
+                    'frames_dropped': stream.frames_dropped,
+                    'reconnects': stream.reconnects
+                }
+                for src, (stream, refcount) in self.streams.items()
+            }
+
+    def close_all(self):
+        with self.lock:
+            streams = [stream for stream, _ in self.streams.values()]
+            for stream in streams:
+                self.add_closed(stream)
+            self.streams.clear()
+        for stream in streams:
+            stream.stop()
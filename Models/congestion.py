@@ -0,0 +1,67 @@
+import numpy as np
+
+LEVELS = ('low', 'medium', 'high')
+
+
+def build_palette(config):
+    """3x3 uint8 RGB lookup table indexed by congestion level (low, medium, high)"""
+    return np.array([config['colors'][level] for level in LEVELS], dtype=np.uint8)
+
+
+class CongestionAnalysis:
+    """Single-pass congestion classification of a density map
+
+    The density map is classified once into a uint8 level map (0 = low,
+    1 = medium, 2 = high, relative to its own maximum). Pixel counts,
+    percentages, the coloured heat map and the density image are all derived
+    from that level map instead of re-normalising and re-masking the density
+    map for each of them.
+    """
+
+    def __init__(self, density_map, config):
+        self.density_map = density_map
+        self.config = config
+        self.max_density = float(density_map.max())
+        self.total_density = float(density_map.sum())
+
+        # Compare against scaled thresholds instead of materialising density / max
+        scale = self.max_density if self.max_density > 0 else 1.0
+        self.levels = (density_map > config['medium_threshold'] * scale).view(np.uint8)
+        self.levels += density_map > config['high_threshold'] * scale
+
+        self.pixel_counts = np.bincount(self.levels.ravel(), minlength=len(LEVELS))
+        self._heat_map = None
+
+    def heat_map(self):
+        """Colour-coded heat map at density map resolution (palette lookup)"""
+        if self._heat_map is None:
+            self._heat_map = build_palette(self.config)[self.levels]
+        return self._heat_map
+
+    def density_image(self):
+        """Density map scaled to 0-255 by its maximum, as uint8"""
+        scale = 255.0 / self.max_density if self.max_density > 0 else 0.0
+        return np.clip(self.density_map * scale, 0, 255).astype(np.uint8)
+
+    @property
+    def nbytes(self):
+        """Memory held by the derived arrays (not the density map itself)"""
+        return self.levels.nbytes + (self._heat_map.nbytes if self._heat_map is not None else 0)
+
+    def stats(self, predicted_count):
+        """Congestion statistics in the /predict response layout"""
+        total_pixels = self.density_map.size
+        low, medium, high = (int(count) for count in self.pixel_counts[:len(LEVELS)])
+
+        return {
+            'total_count': round(predicted_count, 1),
+            'high_congestion_pixels': high,
+            'medium_congestion_pixels': medium,
+            'low_congestion_pixels': low,
+            'high_congestion_percent': round(100 * high / total_pixels, 1),
+            'medium_congestion_percent': round(100 * medium / total_pixels, 1),
+            'low_congestion_percent': round(100 * low / total_pixels, 1),
+            'max_density': self.max_density,
+            'avg_density': self.total_density / total_pixels,
+            'total_density': self.total_density
+        }
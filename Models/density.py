@@ -1,18 +1,47 @@
-from flask import Flask, request, jsonify, send_file
+import time
+# Taken before the heavy imports so /ready reports the whole cold start
+PROCESS_STARTED = time.perf_counter()
+
+from flask import Flask, Request, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 import torch
 import torch.nn as nn
 import cv2
 import numpy as np
-from scipy.ndimage import gaussian_filter
-import matplotlib.pyplot as plt
 import io
 import base64
 from PIL import Image
 import os
+import uuid
+import threading
+import hashlib
+import json
 from werkzeug.utils import secure_filename
+from inference_batcher import InferenceBatcher
+from congestion import CongestionAnalysis
+from model_backends import backend_for_path, create_backend
+from tiling import fit_to_pixel_budget, plan_tiles, stitch_density_maps
+from result_cache import ResultCache
+from video_counting import DensitySmoother, FrameReader
+from job_queue import JobQueue, MemoryJobStore, QueueFull, SqliteJobStore
+from metrics import CONTENT_TYPE, MetricsRegistry, StageTimings, current_timings, timed
+from zones import ZoneRegistry
+from incremental_density import IncrementalDensity, SessionRegistry
+
+class InMemoryUploadRequest(Request):
+    """Keeps multipart file parts in memory instead of Werkzeug's temp file spool
+
+    Werkzeug spools uploads over 500 KB to a temporary file; uploads here
+    are bounded by MAX_CONTENT_LENGTH, so they are buffered in a BytesIO.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not DECODE_IN_MEMORY:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 CORS(app)
 
 # Configuration
@@ -20,11 +49,195 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp'}
 UPLOAD_FOLDER = 'temp_uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Decode uploads straight from the request body; set to False to fall back to
+# saving each upload under UPLOAD_FOLDER and reading it back from disk
+DECODE_IN_MEMORY = True
 
-# Global model variable
+# Global model variable: an inference backend (see model_backends.py) that maps
+# an NxCxHxW tensor to an Nx1xhxw numpy density map
 model = None
+# 'eager', 'torchscript' or 'onnx'; None picks the backend from the model file extension
+MODEL_BACKEND = None
+# Eager backend only: 'fp32', 'channels_last' or 'bf16' (autocast, needs CPU bf16 support).
+# For int8, load the TorchScript file written by quantize_model.py
+MODEL_PRECISION = 'fp32'
+_input_buffers = threading.local()
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
+# Micro-batching configuration: concurrent /predict calls are stacked into one
+# forward pass, waiting at most max_latency_ms for a batch to fill
+BATCH_CONFIG = {
+    'enabled': True,
+    'max_batch_size': 8,
+    'max_latency_ms': 10
+}
+batcher = None
+
+# Working resolution: 'fixed' resizes every image to 1024x768 (the training
+# size); 'adaptive' keeps small images at native size, downscales to the
+# max_pixels budget, and splits images above it into overlapping tiles
+RESOLUTION_CONFIG = {
+    'mode': 'fixed',
+    'fixed_size': (1024, 768),
+    'max_pixels': 1024 * 768,
+    'tiling': True,
+    'max_tiled_pixels': 4096 * 3072,
+    'tile_size': (1024, 768),
+    'tile_overlap': 128
+}
+RESOLUTION_MODES = ('fixed', 'adaptive')
+GT_DOWNSAMPLE = 4
+
+# Response payload options for /predict
+RESPONSE_MODES = ('full', 'stats_only', 'count_only', 'density_raw')
+IMAGE_KEYS = ('original', 'heatmap_overlay', 'pure_heatmap', 'density_map')
+IMAGE_FORMATS = {'png': 'PNG', 'jpeg': 'JPEG', 'jpg': 'JPEG', 'webp': 'WEBP'}
+
+# Result cache keyed by a hash of the uploaded bytes, the model version and the
+# heat map/resolution config; evicted entries spill to spill_dir when it is set
+CACHE_CONFIG = {
+    'enabled': True,
+    'max_bytes': 256 * 1024 * 1024,
+    'ttl_seconds': 300,
+    'spill_dir': None,
+    'max_spill_bytes': 2 * 1024 * 1024 * 1024
+}
+result_cache = None
+model_version = None
+
+# Counting zones: polygons/rectangles sent with a request ('zones', JSON) or
+# registered once with POST /zones and referenced by id ('zone_set'). Masks
+# are rasterised at density map resolution and cached per image size.
+# store_dir shares registered sets between serve_density.py workers and restarts
+ZONE_CONFIG = {
+    'max_zone_sets': 256,
+    'max_zones': 64,
+    'store_dir': 'zones',
+    'level_min_percent': 10.0  # a zone's level: most severe level covering at least this share of it
+}
+zone_registry = ZoneRegistry(ZONE_CONFIG['max_zone_sets'], ZONE_CONFIG['max_zones'], ZONE_CONFIG['store_dir'])
+
+# Warm-up before the server reports ready: `iterations` forward passes at the
+# fixed working size for each batch size (the first pass pays oneDNN/cuDNN
+# kernel selection and allocator growth), then one heat map + encode.
+# iterations 0 skips it; /ready answers 503 until load_model has finished
+WARMUP_CONFIG = {
+    'iterations': 2,
+    'batch_sizes': (1, 8)
+}
+startup = {
+    'ready': False,
+    'import_seconds': round(time.perf_counter() - PROCESS_STARTED, 3),
+    'load_seconds': None,
+    'warmup_seconds': None,
+    'startup_seconds': None
+}
+
+# Asynchronous jobs (/jobs): uploads are queued and processed by a local pool of
+# worker threads. 'memory' keeps the queue in process; 'sqlite' keeps it in
+# sqlite_path, where it survives restarts and is shared by all serve_density.py
+# workers (the default there with more than one worker). Claimed sqlite jobs hold
+# a lease_seconds lease renewed while they run, so jobs of a worker that died are
+# requeued. reserved_workers only take high-priority jobs, which is the default
+# for count_only / stats_only requests
+JOB_CONFIG = {
+    'enabled': True,
+    'store': 'memory',
+    'sqlite_path': 'jobs.sqlite3',
+    'lease_seconds': 60,
+    'workers': 2,
+    'reserved_workers': 1,
+    'result_ttl_seconds': 600,
+    'max_queued': 256
+}
+JOB_PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+job_queue = None
+
+# Video / stream counting (/predict/video): frames are decoded on a background
+# thread, sampled at sample_fps and run through the model in batches. Uploads
+# are still bounded by MAX_CONTENT_LENGTH; longer footage can be passed by URL
+VIDEO_CONFIG = {
+    'sample_fps': 2.0,
+    'max_sample_fps': 30.0,
+    'max_frames': 1800,
+    'max_seconds': 600,  # live streams stop after this many seconds
+    'batch_size': 8,
+    'queue_size': 32,
+    'allowed_schemes': ('rtsp', 'rtsps', 'rtmp', 'http', 'https')
+}
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+
+# Fixed-camera sessions (/sessions/<id>/frames): each frame is compared with
+# the last one per tile_size tile at density resolution, and only tiles that
+# changed are re-run (padded by half MC_CNN's ~96 px receptive field) and
+# patched into the previous density map. Full passes run for the first frame,
+# every keyframe_interval frames and when over full_refresh_fraction of the
+# tiles changed. Sessions live in process memory and the shared-socket workers
+# of serve_density.py cannot route a camera to one of them, so serve_density.py
+# disables sessions (503) unless it runs a single worker
+SESSION_CONFIG = {
+    'enabled': True,
+    'tile_size': 128,
+    'padding': 48,
+    'pixel_threshold': 25,        # grey-level difference that counts as a changed pixel
+    'min_changed_fraction': 0.01, # changed pixels that mark a tile for recompute
+    'full_refresh_fraction': 0.3,
+    'keyframe_interval': 150,
+    'smoothing': 0.6,             # weight of the previous smoothed count
+    'max_sessions': 64,
+    'idle_timeout': 600
+}
+density_sessions = SessionRegistry(
+    lambda: IncrementalDensity(
+        tile_size=SESSION_CONFIG['tile_size'],
+        padding=SESSION_CONFIG['padding'],
+        downsample=GT_DOWNSAMPLE,
+        pixel_threshold=SESSION_CONFIG['pixel_threshold'],
+        min_changed_fraction=SESSION_CONFIG['min_changed_fraction'],
+        full_refresh_fraction=SESSION_CONFIG['full_refresh_fraction'],
+        keyframe_interval=SESSION_CONFIG['keyframe_interval'],
+        smoothing=SESSION_CONFIG['smoothing']
+    ),
+    max_sessions=SESSION_CONFIG['max_sessions'],
+    idle_timeout=SESSION_CONFIG['idle_timeout']
+)
+
+# Prometheus metrics at /metrics. Every pipeline stage is timed into
+# crowd_stage_seconds; with server_timing on, clients that send
+# 'X-Server-Timing: 1' (or ?server_timing=1) get a Server-Timing header
+METRICS_CONFIG = {
+    'server_timing': True
+}
+metrics_registry = MetricsRegistry(prefix='crowd_')
+stage_seconds = metrics_registry.histogram('stage_seconds', 'Time spent in each prediction stage', ('stage',))
+request_seconds = metrics_registry.histogram('request_seconds', 'Request latency by endpoint', ('endpoint',))
+requests_total = metrics_registry.counter('requests_total', 'Requests by endpoint and status', ('endpoint', 'status'))
+request_errors_total = metrics_registry.counter(
+    'request_errors_total', 'Requests answered with a 4xx or 5xx status', ('endpoint', 'status'))
+video_frames_total = metrics_registry.counter(
+    'video_frames_total', 'Video frames by outcome (decoded, processed, dropped)', ('outcome',))
+session_tiles_total = metrics_registry.counter(
+    'session_tiles_total', 'Camera session tiles by outcome (recomputed, reused)', ('outcome',))
+
+def batcher_metric(key):
+    return lambda: batcher.stats()[key] if batcher is not None else None
+
+def cache_metric(*keys):
+    return lambda: {(key,): result_cache.stats()[key] for key in keys} if result_cache is not None else None
+
+# Queue depths and cache counters are read from the live objects at scrape time
+metrics_registry.callback('batch_queue_depth', 'Images waiting for a micro-batch', batcher_metric('queue_depth'))
+metrics_registry.callback('batches_total', 'Micro-batches run', batcher_metric('batches'), type='counter')
+metrics_registry.callback('batched_images_total', 'Images run through micro-batches', batcher_metric('items'),
+                          type='counter')
+metrics_registry.callback('cache_events_total', 'Result cache hits, misses and evictions',
+                          cache_metric('hits', 'misses', 'spill_hits', 'evictions'), type='counter',
+                          labelnames=('event',))
+metrics_registry.callback('cache_bytes', 'Bytes held in memory by the result cache',
+                          lambda: result_cache.stats()['bytes'] if result_cache is not None else None)
+metrics_registry.callback('jobs', 'Async prediction jobs by status',
+                          lambda: job_queue.stats()['jobs'] if job_queue is not None else None, labelnames=('status',))
+
 # Heat map configuration
 HEAT_MAP_CONFIG = {
     'high_threshold': 0.7,
@@ -101,94 +314,354 @@ class MC_CNN(nn.Module):
         x = self.fusion_layer(x)
         return x
 
+# ====================================================================================================
+# INFERENCE
+# ====================================================================================================
+def run_model_batch(img_tensors):
+    """Run one forward pass over a list of same-sized 1xCxHxW tensors"""
+    batch = img_tensors[0] if len(img_tensors) == 1 else torch.cat(img_tensors, 0)
+    density_maps = model(batch)
+    if len(img_tensors) == 1:
+        return [density_maps[0, 0]]
+    # Own copies: a view would keep the whole batch output alive (e.g. in the result cache)
+    return [density_maps[i, 0].copy() for i in range(len(img_tensors))]
+
+def predict_density(img_tensor):
+    """Predict the density map for one image, batched with concurrent requests"""
+    if batcher is not None:
+        return batcher.predict(img_tensor)
+    return run_model_batch([img_tensor])[0]
+
+def run_batched(tensors):
+    """Density maps for same-shaped 1x3xHxW tensors: through the batcher when it runs, else in max_batch_size chunks"""
+    if batcher is not None:
+        # Same shape, so the batcher stacks them (and any concurrent same-size requests)
+        futures = [batcher.submit(tensor) for tensor in tensors]
+        return [future.result() for future in futures]
+    chunk = BATCH_CONFIG['max_batch_size']
+    density_maps = []
+    for start in range(0, len(tensors), chunk):
+        density_maps.extend(run_model_batch(tensors[start:start + chunk]))
+    return density_maps
+
+def predict_tiled(img_tensor):
+    """Predict a large 1x3xHxW tensor as a batch of overlapping tiles and stitch the density maps"""
+    height, width = img_tensor.shape[2:]
+    overlap = RESOLUTION_CONFIG['tile_overlap']
+    tiles = plan_tiles(width, height, RESOLUTION_CONFIG['tile_size'], overlap, GT_DOWNSAMPLE)
+    density_tiles = run_batched([img_tensor[:, :, y:y + h, x:x + w] for x, y, w, h in tiles])
+    return stitch_density_maps(density_tiles, tiles, width, height, overlap, GT_DOWNSAMPLE)
+
+def working_size(width, height, resolution):
+    """Network input size for an image and whether it should be tiled"""
+    if resolution == 'fixed':
+        return RESOLUTION_CONFIG['fixed_size'], False
+    if width * height <= RESOLUTION_CONFIG['max_pixels']:
+        return fit_to_pixel_budget(width, height, width * height, GT_DOWNSAMPLE), False
+    if not RESOLUTION_CONFIG['tiling']:
+        return fit_to_pixel_budget(width, height, RESOLUTION_CONFIG['max_pixels'], GT_DOWNSAMPLE), False
+    return fit_to_pixel_budget(width, height, RESOLUTION_CONFIG['max_tiled_pixels'], GT_DOWNSAMPLE), True
+
+def predict_image(image, resolution=None):
+    """Preprocess and predict one RGB image (or image path) at the configured working resolution"""
+    if isinstance(image, str):
+        with timed(stage_seconds, 'decode'):
+            image = read_image_file(image)
+    size, tiled = working_size(image.shape[1], image.shape[0], resolution or RESOLUTION_CONFIG['mode'])
+    with timed(stage_seconds, 'preprocess'):
+        img_tensor, original_img = preprocess_image(image, target_size=size, gt_downsample=GT_DOWNSAMPLE,
+                                                    reuse_buffers=not tiled)
+    # Includes the wait for a micro-batch to fill
+    with timed(stage_seconds, 'inference'):
+        if tiled:
+            return predict_tiled(img_tensor), original_img
+        return predict_density(img_tensor), original_img
+
+def predict_frames(frames, resolution=None):
+    """Density maps for a list of RGB frames, same-sized frames sharing batched forward passes"""
+    resolution = resolution or RESOLUTION_CONFIG['mode']
+    density_maps = [None] * len(frames)
+    pending = {}  # tensor shape -> [(index, tensor)]
+    
+    for i, frame in enumerate(frames):
+        size, tiled = working_size(frame.shape[1], frame.shape[0], resolution)
+        if tiled:
+            density_maps[i] = predict_image(frame, resolution)[0]
+            continue
+        with timed(stage_seconds, 'preprocess'):
+            img_tensor, _ = preprocess_image(frame, target_size=size, gt_downsample=GT_DOWNSAMPLE,
+                                             reuse_buffers=False)
+        pending.setdefault(tuple(img_tensor.shape), []).append((i, img_tensor))
+    
+    with timed(stage_seconds, 'inference'):
+        for group in pending.values():
+            for (i, _), density_map in zip(group, run_batched([img_tensor for _, img_tensor in group])):
+                density_maps[i] = density_map
+    
+    return density_maps
+
+def start_result_cache():
+    """(Re)create the result cache; cached results never outlive the model that produced them"""
+    global result_cache
+    result_cache = None
+    if CACHE_CONFIG['enabled']:
+        result_cache = ResultCache(
+            max_bytes=CACHE_CONFIG['max_bytes'],
+            ttl_seconds=CACHE_CONFIG['ttl_seconds'],
+            spill_dir=CACHE_CONFIG['spill_dir'],
+            max_spill_bytes=CACHE_CONFIG['max_spill_bytes']
+        )
+
+def start_job_queue():
+    """(Re)start the async job workers in front of the prediction pipeline"""
+    global job_queue
+    if job_queue is not None:
+        job_queue.stop()
+        job_queue = None
+    if JOB_CONFIG['enabled']:
+        store = SqliteJobStore(JOB_CONFIG['sqlite_path'], JOB_CONFIG['lease_seconds']) if JOB_CONFIG['store'] == 'sqlite' else MemoryJobStore()
+        job_queue = JobQueue(
+            run_prediction_job,
+            store=store,
+            workers=JOB_CONFIG['workers'],
+            reserved_workers=JOB_CONFIG['reserved_workers'],
+            reserved_priority=JOB_PRIORITIES['high'],
+            result_ttl=JOB_CONFIG['result_ttl_seconds'],
+            max_queued=JOB_CONFIG['max_queued']
+        ).start()
+
+def start_batcher():
+    """(Re)start the micro-batching scheduler in front of the global model"""
+    global batcher
+    if batcher is not None:
+        batcher.stop()
+        batcher = None
+    if BATCH_CONFIG['enabled']:
+        batcher = InferenceBatcher(
+            run_model_batch,
+            max_batch_size=BATCH_CONFIG['max_batch_size'],
+            max_latency_ms=BATCH_CONFIG['max_latency_ms']
+        ).start()
+
 # ====================================================================================================
 # HELPER FUNCTIONS
 # ====================================================================================================
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def preprocess_image(image_path, target_size=(1024, 768), gt_downsample=4):
-    """Preprocess image for prediction"""
-    img = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
-    original_img = img.copy()
+def allowed_video(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in VIDEO_EXTENSIONS
+
+def decode_image_bytes(data):
+    """Decode an encoded image from memory into an RGB array"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    img = cv2.imdecode(buffer, cv2.IMREAD_COLOR) if buffer.size else None
+    if img is None:
+        raise ValueError('Could not decode image')
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def read_image_file(image_path):
+    """Read an image file from disk into an RGB array"""
+    img = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError('Could not decode image')
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+def preprocess_image(image, target_size=(1024, 768), gt_downsample=4, reuse_buffers=True):
+    """Preprocess an RGB image array (or an image path) for prediction
+
+    With reuse_buffers the returned tensor lives in a per-thread buffer that is
+    overwritten by the next call on the same thread; pass False to keep it.
+    """
+    if isinstance(image, str):
+        image = read_image_file(image)
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    original_img = image
     
-    if len(img.shape) == 2:
-        img = np.stack([img, img, img], axis=-1)
+    # Final size aligned to the density map stride, computed once
+    width, height = target_size if target_size else (image.shape[1], image.shape[0])
+    width = max(gt_downsample, width // gt_downsample * gt_downsample)
+    height = max(gt_downsample, height // gt_downsample * gt_downsample)
     
-    if target_size:
-        img = cv2.resize(img, target_size)
+    if reuse_buffers:
+        resized, img_tensor = get_input_buffers(height, width)
+    else:
+        resized = None
+        img_tensor = torch.empty((1, 3, height, width), dtype=torch.float32)
     
-    ds_rows = int(img.shape[0] // gt_downsample)
-    ds_cols = int(img.shape[1] // gt_downsample)
-    img = cv2.resize(img, (ds_cols * gt_downsample, ds_rows * gt_downsample))
+    if image.shape[:2] != (height, width):
+        image = cv2.resize(image, (width, height), dst=resized)
     
-    img = img.transpose((2, 0, 1))
-    img_tensor = torch.tensor(img / 255.0, dtype=torch.float).unsqueeze(0)
+    # uint8 HWC -> float32 NCHW in one copy, normalised in place
+    img_tensor[0].copy_(torch.from_numpy(image).permute(2, 0, 1))
+    img_tensor.div_(255.0)
     
     return img_tensor, original_img
 
-def create_heat_map_overlay(image, density_map, alpha=0.6):
+def get_input_buffers(height, width):
+    """Per-thread reusable resize buffer and (pinned on CUDA) input tensor"""
+    buffers = getattr(_input_buffers, 'buffers', None)
+    if buffers is None:
+        buffers = _input_buffers.buffers = {}
+    if (height, width) not in buffers:
+        if len(buffers) >= 4:
+            buffers.clear()
+        buffers[(height, width)] = (
+            np.empty((height, width, 3), dtype=np.uint8),
+            torch.empty((1, 3, height, width), dtype=torch.float32, pin_memory=(device == 'cuda'))
+        )
+    return buffers[(height, width)]
+
+def create_heat_map_overlay(image, density_map, alpha=0.6, analysis=None):
     """Create color-coded heat map overlay"""
-    if density_map.max() > 0:
-        normalized_density = density_map / density_map.max()
-    else:
-        normalized_density = density_map
+    if analysis is None:
+        analysis = CongestionAnalysis(density_map, HEAT_MAP_CONFIG)
     
-    heat_map = np.zeros((*density_map.shape, 3), dtype=np.uint8)
+    heat_map_resized = cv2.resize(analysis.heat_map(), (image.shape[1], image.shape[0]))
+    overlay = cv2.addWeighted(image.astype(np.uint8, copy=False), 1-alpha, heat_map_resized, alpha, 0)
     
-    high_threshold = HEAT_MAP_CONFIG['high_threshold']
-    medium_threshold = HEAT_MAP_CONFIG['medium_threshold']
+    return overlay, heat_map_resized
+
+def get_congestion_stats(density_map, predicted_count, analysis=None):
+    """Calculate congestion statistics"""
+    if analysis is None:
+        analysis = CongestionAnalysis(density_map, HEAT_MAP_CONFIG)
+    return analysis.stats(predicted_count)
+
+def image_to_base64(img_array, image_format='png', quality=85):
+    """Convert numpy array to base64 string"""
+    img_pil = Image.fromarray(img_array.astype(np.uint8))
+    buffer = io.BytesIO()
+    if image_format == 'png':
+        img_pil.save(buffer, format='PNG')
+    else:
+        img_pil.save(buffer, format=IMAGE_FORMATS[image_format], quality=quality)
+    img_str = base64.b64encode(buffer.getvalue()).decode()
+    return img_str
+
+def parse_response_options(values, mode=None):
+    """Read the response mode, image subset, image encoding and working resolution from request parameters"""
+    mode = (mode or values.get('mode') or 'full').lower()
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Invalid mode '{mode}', expected one of: {', '.join(RESPONSE_MODES)}")
     
-    # Apply colors
-    low_mask = normalized_density <= medium_threshold
-    heat_map[low_mask] = HEAT_MAP_CONFIG['colors']['low']
+    images = ()
+    if mode == 'full':
+        requested = (values.get('images') or 'all').lower()
+        if requested == 'all':
+            images = IMAGE_KEYS
+        elif requested != 'none':
+            images = tuple(key.strip() for key in requested.split(',') if key.strip())
+            unknown = [key for key in images if key not in IMAGE_KEYS]
+            if unknown:
+                raise ValueError(f"Unknown image(s): {', '.join(unknown)}")
     
-    medium_mask = (normalized_density > medium_threshold) & (normalized_density <= high_threshold)
-    heat_map[medium_mask] = HEAT_MAP_CONFIG['colors']['medium']
+    image_format = (values.get('format') or 'png').lower()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Invalid format '{image_format}', expected one of: {', '.join(IMAGE_FORMATS)}")
     
-    high_mask = normalized_density > high_threshold
-    heat_map[high_mask] = HEAT_MAP_CONFIG['colors']['high']
+    try:
+        quality = int(values.get('quality', 85))
+    except ValueError:
+        raise ValueError('quality must be an integer between 1 and 100')
+    if not 1 <= quality <= 100:
+        raise ValueError('quality must be an integer between 1 and 100')
     
-    heat_map_resized = cv2.resize(heat_map, (image.shape[1], image.shape[0]))
-    overlay = cv2.addWeighted(image.astype(np.uint8), 1-alpha, heat_map_resized, alpha, 0)
+    resolution = (values.get('resolution') or RESOLUTION_CONFIG['mode']).lower()
+    if resolution not in RESOLUTION_MODES:
+        raise ValueError(f"Invalid resolution '{resolution}', expected one of: {', '.join(RESOLUTION_MODES)}")
     
-    return overlay, heat_map_resized
+    return {'mode': mode, 'images': images, 'format': image_format, 'quality': quality,
+            'resolution': resolution, 'zones': parse_zones(values)}
 
-def get_congestion_stats(density_map, predicted_count):
-    """Calculate congestion statistics"""
-    if density_map.max() > 0:
-        normalized_density = density_map / density_map.max()
-    else:
-        normalized_density = density_map
+def parse_zones(values):
+    """Zone set for a request: inline 'zones' JSON (registered on the fly) or a registered 'zone_set' id"""
+    if values.get('zones'):
+        return zone_registry.register(values['zones'])
+    zone_set_id = values.get('zone_set')
+    if not zone_set_id:
+        return None
+    zone_set = zone_registry.get(zone_set_id)
+    if zone_set is None:
+        raise ValueError(f"Unknown zone_set '{zone_set_id}', register it with POST /zones")
+    return zone_set
+
+def congestion_summary(stats):
+    """The congestion_analysis block of a response"""
+    return {
+        'high_congestion_percent': stats['high_congestion_percent'],
+        'medium_congestion_percent': stats['medium_congestion_percent'],
+        'low_congestion_percent': stats['low_congestion_percent'],
+        'high_congestion_pixels': stats['high_congestion_pixels'],
+        'medium_congestion_pixels': stats['medium_congestion_pixels'],
+        'low_congestion_pixels': stats['low_congestion_pixels']
+    }
+
+def parse_video_options(values):
+    """Sampling, smoothing, batching and detail options for /predict/video"""
+    def number(name, cast, default, low, high):
+        try:
+            value = cast(values.get(name, default))
+        except (TypeError, ValueError):
+            raise ValueError(f'{name} must be a number between {low} and {high}')
+        if not low <= value <= high:
+            raise ValueError(f'{name} must be a number between {low} and {high}')
+        return value
     
-    high_threshold = HEAT_MAP_CONFIG['high_threshold']
-    medium_threshold = HEAT_MAP_CONFIG['medium_threshold']
+    mode = (values.get('mode') or 'stats_only').lower()
+    if mode not in ('stats_only', 'count_only'):
+        raise ValueError("Invalid mode for video, expected one of: stats_only, count_only")
     
-    high_congestion = np.sum(normalized_density > high_threshold)
-    medium_congestion = np.sum((normalized_density > medium_threshold) & (normalized_density <= high_threshold))
-    low_congestion = np.sum(normalized_density <= medium_threshold)
-    total_pixels = density_map.size
+    resolution = (values.get('resolution') or RESOLUTION_CONFIG['mode']).lower()
+    if resolution not in RESOLUTION_MODES:
+        raise ValueError(f"Invalid resolution '{resolution}', expected one of: {', '.join(RESOLUTION_MODES)}")
     
     return {
-        'total_count': round(predicted_count, 1),
-        'high_congestion_pixels': int(high_congestion),
-        'medium_congestion_pixels': int(medium_congestion),
-        'low_congestion_pixels': int(low_congestion),
-        'high_congestion_percent': round(100 * high_congestion / total_pixels, 1),
-        'medium_congestion_percent': round(100 * medium_congestion / total_pixels, 1),
-        'low_congestion_percent': round(100 * low_congestion / total_pixels, 1),
-        'max_density': float(density_map.max()),
-        'avg_density': float(density_map.mean()),
-        'total_density': float(density_map.sum())
+        'mode': mode,
+        'resolution': resolution,
+        # 0 samples every frame
+        'sample_fps': number('sample_fps', float, VIDEO_CONFIG['sample_fps'], 0, VIDEO_CONFIG['max_sample_fps']),
+        'max_frames': number('max_frames', int, VIDEO_CONFIG['max_frames'], 1, VIDEO_CONFIG['max_frames']),
+        'max_seconds': number('max_seconds', float, VIDEO_CONFIG['max_seconds'], 1, VIDEO_CONFIG['max_seconds']),
+        'batch_size': number('batch_size', int, VIDEO_CONFIG['batch_size'], 1, BATCH_CONFIG['max_batch_size']),
+        # Weight kept from the previous smoothed density map; 0 disables smoothing
+        'smoothing': number('smoothing', float, 0.0, 0.0, 0.99)
     }
 
-def image_to_base64(img_array):
-    """Convert numpy array to base64 string"""
-    img_pil = Image.fromarray(img_array.astype(np.uint8))
-    buffer = io.BytesIO()
-    img_pil.save(buffer, format='PNG')
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return img_str
+def render_images(original_img, density_map, options, analysis=None):
+    """Render and encode only the images the client asked for"""
+    keys = options['images']
+    images = {}
+    
+    def encode(img):
+        with timed(stage_seconds, 'encode'):
+            return image_to_base64(img, options['format'], options['quality'])
+    
+    if 'original' in keys:
+        images['original'] = encode(original_img)
+    if 'heatmap_overlay' in keys or 'pure_heatmap' in keys:
+        with timed(stage_seconds, 'heat_map'):
+            overlay, heat_map = create_heat_map_overlay(original_img, density_map, analysis=analysis)
+        if 'heatmap_overlay' in keys:
+            images['heatmap_overlay'] = encode(overlay)
+        if 'pure_heatmap' in keys:
+            images['pure_heatmap'] = encode(heat_map)
+    if 'density_map' in keys:
+        if analysis is None:
+            analysis = CongestionAnalysis(density_map, HEAT_MAP_CONFIG)
+        images['density_map'] = encode(analysis.density_image())
+    
+    return images
+
+def density_map_response(density_map, predicted_count):
+    """Raw float16 density map as a binary response"""
+    payload = np.ascontiguousarray(density_map, dtype=np.float16).tobytes()
+    response = send_file(io.BytesIO(payload), mimetype='application/octet-stream')
+    response.headers['X-Density-Shape'] = f"{density_map.shape[0]},{density_map.shape[1]}"
+    response.headers['X-Density-Dtype'] = 'float16'
+    response.headers['X-Predicted-Count'] = f"{predicted_count:.1f}"
+    return response
 
 # ====================================================================================================
 # API ROUTES
@@ -204,9 +677,30 @@ def home():
             <ul>
                 <li>Upload image file with key 'image'</li>
                 <li>Returns count, heat map images, and congestion statistics</li>
+                <li><code>mode</code>: full (default), stats_only, count_only or density_raw</li>
+                <li><code>images</code>: comma separated subset of original, heatmap_overlay, pure_heatmap, density_map (or all / none)</li>
+                <li><code>format</code>: png (default), jpeg or webp, with <code>quality</code> 1-100 for lossy formats</li>
+                <li><code>resolution</code>: fixed (1024x768) or adaptive (native size for small images, tiled for very large ones)</li>
             </ul>
         </li>
-        <li><b>GET /health</b> - Check API health status</li>
+        <li><b>POST /predict/count</b> - Count only (same as mode=count_only)</li>
+        <li><b>Zones</b> (any /predict mode except density_raw, and /jobs): <code>zones</code> = JSON list of <code>{"id": "gate_a", "polygon": [[x, y], ...]}</code> or <code>{"id": ..., "rect": [x, y, w, h]}</code> in image pixels (or <code>{"units": "normalized", "zones": [...]}</code>), or <code>zone_set</code> = id from POST /zones; adds per-zone counts and congestion levels</li>
+        <li><b>POST /sessions/&lt;camera_id&gt;/frames</b> - Next frame of a fixed camera ('image'); only tiles that changed since the previous frame are recomputed. Returns the count, an exponentially smoothed count and tile reuse (<code>mode</code>: stats_only or count_only, zones supported); <b>GET</b> / <b>DELETE /sessions/&lt;camera_id&gt;</b> for session stats or to reset it</li>
+        <li><b>POST /zones</b> - Register a zone set once (JSON body); <b>GET</b> / <b>DELETE /zones/&lt;id&gt;</b> to inspect or remove it</li>
+        <li><b>POST /predict/stats</b> - Count and congestion statistics, no images</li>
+        <li><b>POST /predict/density</b> - Raw float16 density map (shape in X-Density-Shape header)</li>
+        <li><b>POST /jobs</b> - Queue an image (same parameters as /predict, plus <code>priority</code>: high, normal or low); returns a job id</li>
+        <li><b>GET /jobs/&lt;id&gt;</b> - Job status and, once done, the /predict result; <b>DELETE</b> cancels a queued job</li>
+        <li><b>POST /predict/video</b> - Count time series for a video ('video' file) or stream ('url', e.g. rtsp://), streamed as NDJSON
+            <ul>
+                <li><code>sample_fps</code>: frames per second of video to count (default 2, 0 = every frame)</li>
+                <li><code>smoothing</code>: 0-0.99 exponential smoothing of density maps over time (default 0)</li>
+                <li><code>mode</code>: stats_only (default) or count_only; <code>max_frames</code>, <code>max_seconds</code>, <code>batch_size</code>, <code>resolution</code></li>
+            </ul>
+        </li>
+        <li><b>GET /health</b> - Liveness: the process is up (with model, cache, job and startup details)</li>
+        <li><b>GET /ready</b> - Readiness: 200 once the model is loaded and warmed up, 503 before</li>
+        <li><b>GET /metrics</b> - Prometheus metrics (per-stage latency, request counts, queue depths, cache hits); send <code>X-Server-Timing: 1</code> with any request for a Server-Timing header</li>
     </ul>
     
     <h2>Heat Map Color Legend:</h2>
@@ -235,96 +729,617 @@ def health_check():
         'status': 'healthy',
         'model_loaded': model is not None,
         'device': device,
+        'backend': model.name if model is not None else None,
+        'batching': batcher.stats() if batcher is not None else None,
+        'cache': result_cache.stats() if result_cache is not None else None,
+        'jobs': job_queue.stats() if job_queue is not None else None,
+        'zones': zone_registry.stats(),
+        'sessions': {'enabled': SESSION_CONFIG['enabled'], **density_sessions.stats()},
+        'startup': startup,
         'api_version': '1.0'
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: 503 until the model is loaded and warmed up (/health is liveness only)"""
+    status = 200 if startup['ready'] and model is not None else 503
+    return jsonify({**startup, 'ready': status == 200}), status
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: stage/request latency histograms, counters and queue gauges"""
+    return Response(metrics_registry.render(), mimetype=CONTENT_TYPE)
+
+def server_timing_requested():
+    return METRICS_CONFIG['server_timing'] and (
+        request.headers.get('X-Server-Timing') == '1' or request.args.get('server_timing') == '1')
+
+@app.before_request
+def start_request_timing():
+    g.timings = StageTimings()
+    g.timings_token = g.timings.activate()
+
+@app.after_request
+def record_request_metrics(response):
+    timings = g.get('timings')
+    if timings is None:
+        return response
+    # Route pattern, not the raw path, so /jobs/<job_id> stays one series
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_seconds.observe(time.perf_counter() - timings.started, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=response.status_code)
+    if response.status_code >= 400:
+        request_errors_total.inc(endpoint=endpoint, status=response.status_code)
+    if server_timing_requested():
+        response.headers['Server-Timing'] = timings.header()
+    return response
+
+@app.teardown_request
+def reset_request_timing(exc):
+    token = g.pop('timings_token', None)
+    if token is not None:
+        current_timings.reset(token)
+
 @app.route('/predict', methods=['POST'])
 def predict_crowd():
     """Main prediction endpoint"""
+    return handle_prediction()
+
+@app.route('/predict/count', methods=['POST'])
+def predict_count():
+    """Count-only prediction: no statistics, no images"""
+    return handle_prediction(mode='count_only')
+
+@app.route('/predict/stats', methods=['POST'])
+def predict_stats():
+    """Count and congestion statistics without images"""
+    return handle_prediction(mode='stats_only')
+
+@app.route('/predict/density', methods=['POST'])
+def predict_density_raw():
+    """Raw float16 density map as application/octet-stream"""
+    return handle_prediction(mode='density_raw')
+
+class PredictionResult:
+    """Density map of one upload plus the artefacts derived from it, shared through the result cache"""
+    
+    def __init__(self, density_map, image_size=None):
+        self.density_map = density_map
+        self.image_size = image_size  # (width, height) of the upload, for zone coordinates
+        self.predicted_count = float(density_map.sum())
+        self.analysis = None
+        # (image key, format, quality) -> base64 string. Replaced, never modified, so
+        # nbytes can sum it while another request adds renders
+        self.images = {}
+        self.render_lock = threading.Lock()  # one request renders a missing image, others wait for it
+    
+    def __getstate__(self):
+        # Locks cannot be pickled when the result cache spills to disk
+        state = self.__dict__.copy()
+        del state['render_lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.render_lock = threading.Lock()
+    
+    def get_analysis(self):
+        if self.analysis is None:
+            self.analysis = CongestionAnalysis(self.density_map, HEAT_MAP_CONFIG)
+        return self.analysis
+    
+    @property
+    def nbytes(self):
+        total = self.density_map.nbytes + sum(len(img) for img in self.images.values())
+        if self.analysis is not None:
+            total += self.analysis.nbytes
+        return total
+
+def result_cache_key(data, options):
+    """Content hash of an upload, salted with everything that changes its result"""
+    digest = hashlib.blake2b(data, digest_size=20)
+    digest.update(str(model_version).encode())
+    digest.update(json.dumps([HEAT_MAP_CONFIG, RESOLUTION_CONFIG, options['resolution']], sort_keys=True).encode())
+    return digest.hexdigest()
+
+def load_upload(data, filename):
+    """Decoded RGB upload, or a temp file path when DECODE_IN_MEMORY is off; returns (image, temp_path)"""
+    if DECODE_IN_MEMORY:
+        return decode_image_bytes(data), None
+    # Unique name so concurrent uploads of the same filename don't collide
+    temp_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{secure_filename(filename)}")
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    return temp_path, temp_path
+
+def predict_upload(data, filename, options):
+    """Cached prediction for uploaded image bytes; returns (result, decoded image or None, cache key)"""
+    with timed(stage_seconds, 'cache_lookup'):
+        cache_key = result_cache_key(data, options) if result_cache is not None else None
+        result = result_cache.get(cache_key) if cache_key else None
+    image = None
+    temp_path = None
+    
+    try:
+        if result is None:
+            # Preprocess and predict
+            with timed(stage_seconds, 'decode'):
+                image, temp_path = load_upload(data, filename)
+            density_map_np, image = predict_image(image, options['resolution'])
+            result = PredictionResult(density_map_np, (image.shape[1], image.shape[0]))
+    finally:
+        # Clean up temporary file
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    return result, image, cache_key
+
+def handle_prediction(mode=None):
+    """Shared /predict pipeline; only builds the parts of the response that were requested"""
     try:
         if model is None:
             return jsonify({'error': 'Model not loaded'}), 500
         
-        if 'image' not in request.files:
+        with timed(stage_seconds, 'upload'):
+            # First access parses the multipart body
+            files = request.files
+        if 'image' not in files:
             return jsonify({'error': 'No image provided'}), 400
         
-        file = request.files['image']
+        file = files['image']
         if file.filename == '' or not allowed_file(file.filename):
             return jsonify({'error': 'Invalid image file'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(temp_path)
-        
         try:
-            # Preprocess and predict
-            img_tensor, original_img = preprocess_image(temp_path)
-            img_tensor = img_tensor.to(device)
+            options = parse_response_options(request.values, mode)
+            data = file.read()
+            result, image, cache_key = predict_upload(data, file.filename, options)
             
-            with torch.no_grad():
-                density_map = model(img_tensor)
-                predicted_count = density_map.sum().item()
-                density_map_np = density_map.squeeze().cpu().numpy()
+            if options['mode'] == 'density_raw':
+                with timed(stage_seconds, 'encode'):
+                    response = density_map_response(result.density_map, result.predicted_count)
+            else:
+                response_data = build_response(result, options, image, data)
+                response = jsonify(response_data)
             
-            # Create heat map overlay
-            overlay, heat_map = create_heat_map_overlay(original_img, density_map_np)
+            if cache_key:
+                # (Re)insert so the cache accounts for any artefacts rendered this time
+                result_cache.put(cache_key, result)
+            return response
             
-            # Get congestion statistics
-            stats = get_congestion_stats(density_map_np, predicted_count)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+    except Exception as e:
+        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+
+def build_response(result, options, original_img, data):
+    """JSON response for a prediction; only renders images not already cached on the result"""
+    response_data = {
+        'success': True,
+        'predicted_count': round(result.predicted_count, 1)
+    }
+    if options['mode'] == 'count_only':
+        if options['zones'] is not None:
+            response_data['zone_set'] = options['zones'].id
+            response_data['zones'] = zone_counts(result, options['zones'], data)
+        return response_data
+    
+    # Classify congestion once; stats, zones and heat maps share the level map
+    with timed(stage_seconds, 'congestion'):
+        analysis = result.get_analysis()
+        stats = get_congestion_stats(result.density_map, result.predicted_count, analysis)
+    response_data['congestion_analysis'] = congestion_summary(stats)
+    if options['zones'] is not None:
+        response_data['zone_set'] = options['zones'].id
+        response_data['zones'] = zone_counts(result, options['zones'], data, analysis)
+    response_data['density_statistics'] = {
+        'max_density': stats['max_density'],
+        'avg_density': stats['avg_density'],
+        'total_density': stats['total_density']
+    }
+    
+    if options['mode'] == 'full':
+        encoding = (options['format'], options['quality'])
+        with result.render_lock:
+            images = result.images
+            missing = tuple(key for key in options['images'] if (key, *encoding) not in images)
+            if missing:
+                if original_img is None:
+                    # Cache hit without these renders: decode again, but skip the forward pass
+                    original_img = decode_image_bytes(data)
+                # Create heat maps and convert images to base64, only those requested
+                rendered = render_images(original_img, result.density_map, {**options, 'images': missing}, analysis)
+                images = {**images, **{(key, *encoding): img for key, img in rendered.items()}}
+                result.images = images
+        
+        response_data['images'] = {key: images[(key, *encoding)] for key in options['images']}
+        response_data['color_legend'] = {
+            'green': 'Normal crowd density (<30%)',
+            'yellow': 'Moderate congestion (30-70%)',
+            'red': 'High congestion (>70%)'
+        }
+    
+    return response_data
+
+def zone_counts(result, zone_set, data, analysis=None):
+    """Per-zone counts (and congestion levels, given the analysis) for a prediction"""
+    with timed(stage_seconds, 'zones'):
+        image_size = result.image_size
+        if image_size is None and zone_set.units == 'pixels':
+            # Result cached before image sizes were recorded
+            image = decode_image_bytes(data)
+            image_size = result.image_size = (image.shape[1], image.shape[0])
+        levels = analysis.levels if analysis is not None else None
+        return zone_set.summarise(result.density_map, image_size, levels, ZONE_CONFIG['level_min_percent'])
+
+@app.route('/zones', methods=['POST'])
+def register_zones():
+    """Register a zone set (JSON body {'zones': [...], 'units': ...}); returns its id for the zone_set parameter"""
+    spec = request.get_json(silent=True)
+    if spec is None:
+        spec = request.values.get('zones')
+    if not spec:
+        return jsonify({'error': "Provide zones as a JSON body or a 'zones' form field"}), 400
+    try:
+        zone_set = zone_registry.register(spec)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'zone_set': zone_set.id, 'zone_count': len(zone_set.ids), **zone_set.to_dict()}), 201
+
+@app.route('/zones/<zone_set_id>', methods=['GET'])
+def get_zones(zone_set_id):
+    """Definition of a registered zone set"""
+    zone_set = zone_registry.get(zone_set_id)
+    if zone_set is None:
+        return jsonify({'error': 'Zone set not found'}), 404
+    return jsonify({'zone_set': zone_set.id, **zone_set.to_dict()})
+
+@app.route('/zones/<zone_set_id>', methods=['DELETE'])
+def delete_zones(zone_set_id):
+    """Forget a registered zone set"""
+    if not zone_registry.delete(zone_set_id):
+        return jsonify({'error': 'Zone set not found'}), 404
+    return jsonify({'zone_set': zone_set_id, 'deleted': True})
+
+def predict_working_frame(image):
+    """Density map of a frame already at the working size"""
+    img_tensor, _ = preprocess_image(image, target_size=None, gt_downsample=GT_DOWNSAMPLE)
+    return predict_density(img_tensor)
+
+def predict_regions(image, regions):
+    """Density maps of same-sized (x, y, w, h) crops of a frame, in batched forward passes"""
+    return run_batched([preprocess_image(image[y:y + h, x:x + w], target_size=None, gt_downsample=GT_DOWNSAMPLE,
+                                         reuse_buffers=False)[0]
+                        for x, y, w, h in regions])
+
+def sessions_disabled():
+    """Error response when camera sessions are unavailable in this deployment, else None"""
+    if SESSION_CONFIG['enabled']:
+        return None
+    return jsonify({'error': 'Camera sessions need a single serving process (serve_density.py --workers 1)'}), 503
+
+@app.route('/sessions/<session_id>/frames', methods=['POST'])
+def session_frame(session_id):
+    """Next frame of a fixed camera: only the tiles that changed since the last frame are recomputed"""
+    disabled = sessions_disabled()
+    if disabled is not None:
+        return disabled
+    if model is None:
+        return jsonify({'error': 'Model not loaded'}), 500
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image provided'}), 400
+    file = request.files['image']
+    if file.filename == '' or not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid image file'}), 400
+    
+    try:
+        mode = (request.values.get('mode') or 'stats_only').lower()
+        if mode not in ('stats_only', 'count_only'):
+            raise ValueError("Sessions support mode stats_only or count_only")
+        zone_set = parse_zones(request.values)
+        
+        with timed(stage_seconds, 'decode'):
+            original = decode_image_bytes(file.read())
+        with timed(stage_seconds, 'preprocess'):
+            # Same fixed working size as /predict, so tiles line up frame to frame
+            image = cv2.resize(original, RESOLUTION_CONFIG['fixed_size'])
+        with timed(stage_seconds, 'inference'):
+            summary, density_map = density_sessions.get(session_id).update(
+                image, predict_working_frame, predict_regions)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+    
+    session_tiles_total.inc(summary['tiles_recomputed'], outcome='recomputed')
+    session_tiles_total.inc(summary['tiles_total'] - summary['tiles_recomputed'], outcome='reused')
+    response_data = {
+        'success': True,
+        'session_id': session_id,
+        'predicted_count': round(summary['predicted_count'], 1),
+        'smoothed_count': round(summary['smoothed_count'], 1),
+        'full_frame': summary['full_frame'],
+        'tiles_recomputed': summary['tiles_recomputed'],
+        'tiles_total': summary['tiles_total']
+    }
+    
+    analysis = None
+    if mode == 'stats_only':
+        with timed(stage_seconds, 'congestion'):
+            analysis = CongestionAnalysis(density_map, HEAT_MAP_CONFIG)
+            response_data['congestion_analysis'] = congestion_summary(analysis.stats(summary['predicted_count']))
+    if zone_set is not None:
+        with timed(stage_seconds, 'zones'):
+            response_data['zone_set'] = zone_set.id
+            response_data['zones'] = zone_set.summarise(
+                density_map, (original.shape[1], original.shape[0]),
+                analysis.levels if analysis is not None else None, ZONE_CONFIG['level_min_percent'])
+    return jsonify(response_data)
+
+@app.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """Frames, full passes and tile reuse of a camera session"""
+    disabled = sessions_disabled()
+    if disabled is not None:
+        return disabled
+    session = density_sessions.get(session_id, create=False)
+    if session is None:
+        return jsonify({'error': 'Session not found or expired'}), 404
+    return jsonify({'session_id': session_id, **session.stats()})
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Drop a camera session (the next frame starts a new one with a full pass)"""
+    disabled = sessions_disabled()
+    if disabled is not None:
+        return disabled
+    if not density_sessions.delete(session_id):
+        return jsonify({'error': 'Session not found or expired'}), 404
+    return jsonify({'session_id': session_id, 'deleted': True})
+
+@app.route('/predict/video', methods=['POST'])
+def predict_video():
+    """Crowd count time series for a video upload or stream URL, streamed as NDJSON"""
+    if model is None:
+        return jsonify({'error': 'Model not loaded'}), 500
+    
+    try:
+        options = parse_video_options(request.values)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    temp_path = None
+    if 'video' in request.files:
+        file = request.files['video']
+        if file.filename == '' or not allowed_video(file.filename):
+            return jsonify({'error': 'Invalid video file'}), 400
+        # OpenCV decodes from a path, so uploads are written to disk first
+        temp_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex}_{secure_filename(file.filename)}")
+        file.save(temp_path)
+        source = temp_path
+    else:
+        source = (request.values.get('url') or '').strip()
+        scheme = source.split('://', 1)[0].lower() if '://' in source else ''
+        if scheme not in VIDEO_CONFIG['allowed_schemes']:
+            return jsonify({'error': f"Provide a 'video' file or a 'url' with scheme: "
+                                     f"{', '.join(VIDEO_CONFIG['allowed_schemes'])}"}), 400
+    
+    reader = FrameReader(
+        source,
+        sample_fps=options['sample_fps'] or None,
+        max_frames=options['max_frames'],
+        max_seconds=options['max_seconds'],
+        queue_size=VIDEO_CONFIG['queue_size'],
+        live=temp_path is None
+    ).start()
+    return Response(stream_video_counts(reader, options, temp_path), mimetype='application/x-ndjson')
+
+def stream_video_counts(reader, options, temp_path=None):
+    """NDJSON records: one 'frame' per sampled frame, then a 'summary' (or an 'error')"""
+    smoother = DensitySmoother(options['smoothing']) if options['smoothing'] > 0 else None
+    started = time.perf_counter()
+    counts = []
+    peak = None
+    
+    try:
+        while not reader.finished:
+            # Decoding of the next frames overlaps with inference on this batch
+            batch = reader.read_batch(options['batch_size'], timeout=1.0)
+            if not batch:
+                continue
             
-            # Convert images to base64
-            response_data = {
-                'success': True,
-                'predicted_count': round(predicted_count, 1),
-                'congestion_analysis': {
-                    'high_congestion_percent': stats['high_congestion_percent'],
-                    'medium_congestion_percent': stats['medium_congestion_percent'],
-                    'low_congestion_percent': stats['low_congestion_percent'],
-                    'high_congestion_pixels': stats['high_congestion_pixels'],
-                    'medium_congestion_pixels': stats['medium_congestion_pixels'],
-                    'low_congestion_pixels': stats['low_congestion_pixels']
-                },
-                'density_statistics': {
-                    'max_density': stats['max_density'],
-                    'avg_density': stats['avg_density'],
-                    'total_density': stats['total_density']
-                },
-                'images': {
-                    'original': image_to_base64(original_img),
-                    'heatmap_overlay': image_to_base64(overlay),
-                    'pure_heatmap': image_to_base64(heat_map),
-                    'density_map': image_to_base64((density_map_np * 255).astype(np.uint8))
-                },
-                'color_legend': {
-                    'green': 'Normal crowd density (<30%)',
-                    'yellow': 'Moderate congestion (30-70%)',
-                    'red': 'High congestion (>70%)'
+            density_maps = predict_frames([frame for _, _, frame in batch], options['resolution'])
+            for (index, timestamp, _), density_map in zip(batch, density_maps):
+                predicted_count = float(density_map.sum())
+                record = {
+                    'type': 'frame',
+                    'frame_index': index,
+                    'timestamp': round(timestamp, 3),
+                    'predicted_count': round(predicted_count, 1)
                 }
-            }
-            
-            return jsonify(response_data)
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+                
+                if smoother is not None:
+                    density_map = smoother.update(density_map)
+                    predicted_count = float(density_map.sum())
+                    record['smoothed_count'] = round(predicted_count, 1)
+                if options['mode'] == 'stats_only':
+                    stats = get_congestion_stats(density_map, predicted_count)
+                    record['congestion_analysis'] = congestion_summary(stats)
+                
+                counts.append(predicted_count)
+                if peak is None or predicted_count > peak[0]:
+                    peak = (predicted_count, index, timestamp)
+                yield json.dumps(record) + '\n'
+        
+        if reader.error:
+            yield json.dumps({'type': 'error', 'error': reader.error}) + '\n'
+            return
         
+        elapsed = time.perf_counter() - started
+        summary = {
+            'type': 'summary',
+            'success': True,
+            **reader.stats(),
+            'frames_processed': len(counts),
+            'processing_seconds': round(elapsed, 3),
+            'processing_fps': round(len(counts) / elapsed, 2) if elapsed > 0 else None,
+            'smoothing': options['smoothing']
+        }
+        if counts:
+            summary.update({
+                'min_count': round(min(counts), 1),
+                'mean_count': round(sum(counts) / len(counts), 1),
+                'max_count': round(peak[0], 1),
+                'peak_frame_index': peak[1],
+                'peak_timestamp': round(peak[2], 3)
+            })
+        yield json.dumps(summary) + '\n'
+    
     except Exception as e:
-        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+        yield json.dumps({'type': 'error', 'error': f'Video prediction failed: {str(e)}'}) + '\n'
+    
+    finally:
+        reader.stop()
+        video_frames_total.inc(reader.frames_decoded, outcome='decoded')
+        video_frames_total.inc(len(counts), outcome='processed')
+        video_frames_total.inc(reader.frames_dropped, outcome='dropped')
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def run_prediction_job(job):
+    """Job worker entry point: the /predict JSON response for a queued upload"""
+    options = parse_response_options(job.params)
+    result, image, cache_key = predict_upload(job.payload, job.params['filename'], options)
+    response_data = build_response(result, options, image, job.payload)
+    if cache_key:
+        result_cache.put(cache_key, result)
+    return response_data
+
+def parse_job_priority(values, options):
+    """Explicit priority (high, normal, low or an integer), else high for count/stats-only jobs"""
+    priority = values.get('priority')
+    if priority is None:
+        return JOB_PRIORITIES['normal' if options['mode'] == 'full' else 'high']
+    if priority.lower() in JOB_PRIORITIES:
+        return JOB_PRIORITIES[priority.lower()]
+    try:
+        return int(priority)
+    except ValueError:
+        raise ValueError(f"Invalid priority '{priority}', expected an integer or one of: {', '.join(JOB_PRIORITIES)}")
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue an image for prediction; returns a job id to poll with GET /jobs/<id>"""
+    if model is None:
+        return jsonify({'error': 'Model not loaded'}), 500
+    if job_queue is None:
+        return jsonify({'error': 'Async jobs are disabled'}), 503
+    
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image provided'}), 400
+    file = request.files['image']
+    if file.filename == '' or not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid image file'}), 400
+    
+    try:
+        options = parse_response_options(request.values)
+        if options['mode'] == 'density_raw':
+            raise ValueError('density_raw is not available for jobs, use POST /predict/density')
+        priority = parse_job_priority(request.values, options)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Only the raw request values are stored; the worker re-parses them
+    params = {key: request.values[key] for key in ('mode', 'images', 'format', 'quality', 'resolution', 'zone_set')
+              if key in request.values}
+    if options['zones'] is not None:
+        # Inline zones were registered while parsing; the worker looks them up by id
+        params['zone_set'] = options['zones'].id
+    params['filename'] = file.filename
+    try:
+        job_id = job_queue.submit(file.read(), params, priority)
+    except QueueFull as e:
+        return jsonify({'error': f'Job queue is full: {str(e)}'}), 503
+    
+    return jsonify({'job_id': job_id, 'status': 'queued', 'priority': priority,
+                    'status_url': f'/jobs/{job_id}'}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status; includes the prediction result once done"""
+    if job_queue is None:
+        return jsonify({'error': 'Async jobs are disabled'}), 503
+    info = job_queue.get(job_id)
+    if info is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify(info)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a job that has not started yet"""
+    if job_queue is None:
+        return jsonify({'error': 'Async jobs are disabled'}), 503
+    status = job_queue.cancel(job_id)
+    if status is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if status != 'cancelled':
+        return jsonify({'error': f'Job is already {status}', 'status': status}), 409
+    return jsonify({'job_id': job_id, 'status': status})
 
 # ====================================================================================================
 # MODEL LOADING
 # ====================================================================================================
-def load_model(model_path):
-    """Load the trained model"""
-    global model
+def build_mc_cnn(model_path):
+    """Eager MC_CNN with the trained weights loaded"""
+    net = MC_CNN().to(device)
+    net.load_state_dict(torch.load(model_path, map_location=device))
+    return net.eval()
+
+def warm_up(iterations=None, batch_sizes=None):
+    """Run dummy requests through the model and rendering path; returns seconds spent"""
+    iterations = WARMUP_CONFIG['iterations'] if iterations is None else iterations
+    batch_sizes = batch_sizes or WARMUP_CONFIG['batch_sizes']
+    if iterations <= 0:
+        return 0.0
+    
+    started = time.perf_counter()
+    width, height = RESOLUTION_CONFIG['fixed_size']
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    img_tensor, _ = preprocess_image(image, target_size=(width, height), gt_downsample=GT_DOWNSAMPLE)
+    for batch_size in sorted(set(batch_sizes) | {1}):
+        if batch_size > 1 and batcher is None:
+            continue  # without micro-batching only single images reach the model
+        for _ in range(iterations):
+            density_map = run_model_batch([img_tensor] * min(batch_size, BATCH_CONFIG['max_batch_size']))[0]
+    
+    analysis = CongestionAnalysis(density_map, HEAT_MAP_CONFIG)
+    overlay, _ = create_heat_map_overlay(image, density_map, analysis=analysis)
+    image_to_base64(overlay)
+    return time.perf_counter() - started
+
+def load_model(model_path, backend=None, precision=None):
+    """Load the trained model with the eager, TorchScript or ONNX Runtime backend, then warm it up"""
+    global model, model_version
+    startup['ready'] = False
     try:
-        model = MC_CNN().to(device)
-        model.load_state_dict(torch.load(model_path, map_location=device))
-        model.eval()
-        print(f"✅ Model loaded successfully from {model_path}")
-        print(f"🎯 Device: {device}")
+        started = time.perf_counter()
+        backend = backend or MODEL_BACKEND or backend_for_path(model_path)
+        model = create_backend(backend, model_path, build_mc_cnn, device, precision or MODEL_PRECISION)
+        model_version = f"{model.name}:{os.path.abspath(model_path)}:{os.path.getmtime(model_path)}"
+        start_batcher()
+        start_result_cache()
+        start_job_queue()
+        startup['load_seconds'] = round(time.perf_counter() - started, 3)
+        print(f"✅ Model loaded successfully from {model_path} in {startup['load_seconds']:.2f}s")
+        print(f"🎯 Device: {device}, backend: {model.name}")
+        if batcher is not None:
+            print(f"📦 Micro-batching: up to {batcher.max_batch_size} images / {BATCH_CONFIG['max_latency_ms']} ms")
+        
+        startup['warmup_seconds'] = round(warm_up(), 3)
+        startup['startup_seconds'] = round(time.perf_counter() - PROCESS_STARTED, 3)
+        startup['ready'] = True
+        print(f"🔥 Warm-up: {startup['warmup_seconds']:.2f}s, ready {startup['startup_seconds']:.2f}s after start")
         return True
     except Exception as e:
         print(f"❌ Error loading model: {e}")
@@ -343,13 +1358,24 @@ if __name__ == '__main__':
             print("🌐 API will be available at: http://localhost:3000")
             print("📡 Endpoints:")
             print("   GET  /        - API documentation")
-            print("   GET  /health  - Health check")
+            print("   GET  /health  - Health check (liveness)")
+            print("   GET  /ready   - Readiness (model loaded and warmed up)")
+            print("   GET  /metrics - Prometheus metrics")
             print("   POST /predict - Upload image for crowd counting")
+            print("   POST /predict/count   - Count only")
+            print("   POST /predict/stats   - Count and congestion statistics")
+            print("   POST /predict/density - Raw float16 density map")
+            print("   POST /predict/video   - Count time series for a video or stream URL (NDJSON)")
+            print("   POST /jobs            - Queue an image, poll GET /jobs/<id> for the result")
+            print("   POST /zones           - Register counting zones, pass zone_set=<id> to /predict")
+            print("   POST /sessions/<id>/frames - Fixed-camera frames, recomputing only changed tiles")
             print("\n🎨 Heat Map Legend:")
             print("   🟢 Green: Normal density")
             print("   🟡 Yellow: Moderate congestion") 
             print("   🔴 Red: High congestion")
             
+            print("\n💡 For production use serve_density.py (multi-process, thread-tuned workers)")
+            
             app.run(host='0.0.0.0', port=3000, debug=False)
         else:
             print("❌ Failed to load model. API not started.")
@@ -0,0 +1,87 @@
+"""Export MC_CNN to frozen TorchScript and ONNX, and check backend parity
+
+    python export_model.py --checkpoint best_crowd_counting_model.pth --out-dir exported
+    python export_model.py --skip-export --out-dir exported --image testing.jpg
+
+After exporting, every available backend is run on the same input and its
+predicted count is compared with the eager model; the command exits
+non-zero when a backend drifts beyond --tolerance (relative).
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import torch
+
+from density import MC_CNN, build_mc_cnn, preprocess_image, read_image_file
+from model_backends import create_backend, export_onnx, export_torchscript
+
+
+def sample_input(image_path, seed=0):
+    """Preprocessed 1x3x768x1024 tensor from an image, or a fixed random image"""
+    if image_path:
+        image = read_image_file(image_path)
+    else:
+        image = np.random.default_rng(seed).integers(0, 256, (768, 1024, 3), dtype=np.uint8)
+    img_tensor, _ = preprocess_image(image, reuse_buffers=False)
+    return img_tensor
+
+
+def check_parity(paths, example, tolerance):
+    """Compare each backend's count against eager; returns True when all are within tolerance"""
+    reference = float(create_backend('eager', paths['eager'], build_mc_cnn)(example).sum())
+    print(f"eager        count {reference:10.3f}")
+
+    ok = True
+    for backend in ('torchscript', 'onnx'):
+        if not os.path.exists(paths[backend]):
+            print(f"{backend:<12} skipped (no {paths[backend]})")
+            continue
+        try:
+            count = float(create_backend(backend, paths[backend])(example).sum())
+        except ImportError as e:
+            print(f"{backend:<12} skipped ({e})")
+            continue
+        rel_error = abs(count - reference) / max(abs(reference), 1e-6)
+        status = 'ok' if rel_error <= tolerance else 'MISMATCH'
+        ok = ok and rel_error <= tolerance
+        print(f"{backend:<12} count {count:10.3f}  rel.err {rel_error:.2e}  {status}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export MC_CNN to TorchScript and ONNX')
+    parser.add_argument('--checkpoint', default='best_crowd_counting_model.pth')
+    parser.add_argument('--out-dir', default='exported')
+    parser.add_argument('--image', default=None, help='sample image for tracing and the parity check')
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='max relative count error')
+    parser.add_argument('--skip-export', action='store_true', help='only run the parity check')
+    args = parser.parse_args(argv)
+
+    name = os.path.splitext(os.path.basename(args.checkpoint))[0]
+    paths = {
+        'eager': args.checkpoint,
+        'torchscript': os.path.join(args.out_dir, f'{name}.pt'),
+        'onnx': os.path.join(args.out_dir, f'{name}.onnx')
+    }
+    example = sample_input(args.image)
+
+    if not args.skip_export:
+        os.makedirs(args.out_dir, exist_ok=True)
+        net = MC_CNN()
+        net.load_state_dict(torch.load(args.checkpoint, map_location='cpu'))
+        net.eval()
+        print(f"📦 TorchScript -> {export_torchscript(net, paths['torchscript'], example)}")
+        print(f"📦 ONNX        -> {export_onnx(net, paths['onnx'], example, opset=args.opset)}")
+
+    if not check_parity(paths, example, args.tolerance):
+        print("❌ Parity check failed")
+        return 1
+    print("✅ Parity check passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import cv2
+import numpy as np
+
+
+class FrameSampler:
+    """Decides which frames of a stream are worth running the detector on"""
+
+    def should_infer(self, frame, now):
+        raise NotImplementedError
+
+    def observe(self, hands_tracked, now):
+        """Feed back the result of an inference (number of hands seen)"""
+
+
+class EveryNthSampler(FrameSampler):
+    """Fixed-rate sampling: every n-th frame, regardless of content"""
+
+    def __init__(self, n=3):
+        self.n = max(1, int(n))
+        self.count = 0
+
+    def should_infer(self, frame, now):
+        self.count += 1
+        return self.count % self.n == 0
+
+
+class AdaptiveSampler(FrameSampler):
+    """Motion-gated sampling with a target-FPS budget and bursts while hands are tracked
+
+    - While a hand was seen within the last `burst_seconds`, every frame is inferred.
+    - Otherwise inference is limited to `target_fps`, and only happens when a
+      downscaled grayscale copy differs from the last inferred frame in at
+      least `min_changed_fraction` of its pixels (by more than
+      `pixel_threshold` grey levels), or when `max_idle_seconds` have passed.
+    """
+
+    def __init__(self, target_fps=10.0, pixel_threshold=15, min_changed_fraction=0.002,
+                 burst_seconds=1.5, max_idle_seconds=2.0, thumb_size=(128, 96)):
+        self.min_interval = 1.0 / target_fps if target_fps and target_fps > 0 else 0.0
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.burst_seconds = burst_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.thumb_size = thumb_size
+
+        self.reference = None
+        self.last_infer = float('-inf')
+        self.burst_until = float('-inf')
+        self.skipped_static = 0
+
+    def thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def changed(self, thumb):
+        diff = cv2.absdiff(thumb, self.reference)
+        changed_pixels = np.count_nonzero(diff > self.pixel_threshold)
+        return changed_pixels >= self.min_changed_fraction * diff.size
+
+    def should_infer(self, frame, now):
+        if now < self.burst_until:
+            self.last_infer = now
+            return True
+        if now - self.last_infer < self.min_interval:
+            return False
+
+        thumb = self.thumbnail(frame)
+        if (self.reference is None or now - self.last_infer >= self.max_idle_seconds
+                or self.changed(thumb)):
+            self.reference = thumb
+            self.last_infer = now
+            return True
+
+        self.skipped_static += 1
+        return False
+
+    def observe(self, hands_tracked, now):
+        if hands_tracked:
+            self.burst_until = now + self.burst_seconds
+
+
+SAMPLERS = ('adaptive', 'every_nth')
+
+
+def create_sampler(name='adaptive', target_fps=None):
+    if name == 'every_nth':
+        return EveryNthSampler(3)
+    if name == 'adaptive':
+        return AdaptiveSampler(target_fps=target_fps or 10.0)
+    raise ValueError(f"Unknown sampling '{name}', expected one of: {', '.join(SAMPLERS)}")
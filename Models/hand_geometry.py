@@ -0,0 +1,78 @@
+import numpy as np
+
+# MediaPipe hand landmark indices: (base, joint, joint, tip) per finger, thumb first
+FINGER_JOINTS = np.array([
+    [1, 2, 3, 4],      # Thumb: CMC, MCP, IP, tip
+    [5, 6, 7, 8],      # Index: MCP, PIP, DIP, tip
+    [9, 10, 11, 12],   # Middle
+    [13, 14, 15, 16],  # Ring
+    [17, 18, 19, 20]   # Pinky
+])
+WRIST, INDEX_MCP, PINKY_MCP = 0, 5, 17
+NUM_LANDMARKS = 21
+
+
+def landmarks_to_array(hand_landmarks):
+    """(21, 3) float32 array of x, y, z from a MediaPipe landmark list"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks], dtype=np.float32)
+
+
+def hands_from_results(results):
+    """(N, 21, 3) landmarks of all hands in one MediaPipe result"""
+    hands = results.multi_hand_landmarks or []
+    landmarks = np.empty((len(hands), NUM_LANDMARKS, 3), dtype=np.float32)
+    for i, hand in enumerate(hands):
+        landmarks[i] = landmarks_to_array(hand.landmark)
+    return landmarks
+
+
+def joint_bends(landmarks, aspect=1.0):
+    """(N, 5, 2) bend angles in degrees at the two middle joints of each finger
+
+    A straight finger bends ~0 degrees at each joint. x and z are scaled by
+    the frame aspect ratio (width / height) because MediaPipe normalises x
+    and y by different image dimensions.
+    """
+    points = landmarks[:, FINGER_JOINTS] * np.array([aspect, 1.0, aspect], dtype=np.float32)
+    segments = np.diff(points, axis=2)                        # (N, 5, 3, 3)
+    before, after = segments[:, :, :-1], segments[:, :, 1:]   # (N, 5, 2, 3)
+    norms = np.linalg.norm(before, axis=-1) * np.linalg.norm(after, axis=-1)
+    cosines = np.einsum('...i,...i->...', before, after) / np.maximum(norms, 1e-9)
+    return np.degrees(np.arccos(np.clip(cosines, -1.0, 1.0)))
+
+
+def thumb_abducted(landmarks, aspect=1.0):
+    """(N,) whether the thumb tip lies beyond its IP joint on the index side of the palm
+
+    Measured along the hand's own pinky-to-index knuckle axis instead of
+    image x, so the test holds for left and right hands and rotated hands.
+    """
+    scale = np.array([aspect, 1.0], dtype=np.float32)
+    axis = (landmarks[:, INDEX_MCP, :2] - landmarks[:, PINKY_MCP, :2]) * scale
+    outward = (landmarks[:, 4, :2] - landmarks[:, 3, :2]) * scale
+    return np.einsum('ni,ni->n', outward, axis) > 0
+
+
+def finger_states(landmarks, aspect=1.0, max_bend_degrees=50.0):
+    """(N, 5) extended flags for thumb, index, middle, ring, pinky
+
+    A finger is extended when both of its middle joints are bent less than
+    max_bend_degrees; the thumb must additionally point away from the palm.
+    """
+    extended = (joint_bends(landmarks, aspect) < max_bend_degrees).all(axis=-1)
+    extended[:, 0] &= thumb_abducted(landmarks, aspect)
+    return extended
+
+
+def palm_open(landmarks, aspect=1.0, min_fingers=4, max_bend_degrees=50.0):
+    """(N,) open-palm classification: at least min_fingers fingers extended"""
+    if len(landmarks) == 0:
+        return np.zeros(0, dtype=bool)
+    return finger_states(landmarks, aspect, max_bend_degrees).sum(axis=1) >= min_fingers
+
+
+def bounding_boxes(landmarks, width, height):
+    """(N, 4) int pixel boxes [x_min, y_min, x_max, y_max], one min/max pass per batch"""
+    xy = landmarks[:, :, :2]
+    scale = np.array([width, height, width, height], dtype=np.float32)
+    return (np.concatenate([xy.min(axis=1), xy.max(axis=1)], axis=1) * scale).astype(int)
@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from tiling import plan_tiles
+
+
+class IncrementalDensity:
+    """Density map of one fixed camera, recomputed only where the scene changed
+
+    Frames (RGB, all at the same working size) are compared at density map
+    resolution against a reference: the input each tile was last computed
+    from, so slow drift still triggers a recompute eventually. Tiles where
+    more than `min_changed_fraction` of the pixels differ by over
+    `pixel_threshold` grey levels are re-run through the network as crops
+    padded by `padding` pixels (half the receptive field), and only the
+    unpadded centre of each crop is patched into the map. Crops stay
+    aligned to `downsample`, so pooling windows match the full-frame pass.
+
+    The whole frame is recomputed for the first frame, every
+    `keyframe_interval` frames and when more than `full_refresh_fraction` of
+    the tiles changed (padded crops overlap, so past that point one full
+    pass is cheaper). Counts are exponentially smoothed with weight
+    `smoothing` on the previous value.
+    """
+
+    def __init__(self, tile_size=128, padding=48, downsample=4, pixel_threshold=25, min_changed_fraction=0.01,
+                 full_refresh_fraction=0.3, keyframe_interval=150, smoothing=0.6):
+        self.tile_size = tile_size // downsample * downsample
+        self.padding = padding // downsample * downsample
+        self.downsample = downsample
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.full_refresh_fraction = full_refresh_fraction
+        self.keyframe_interval = keyframe_interval
+        self.smoothing = smoothing
+
+        self.density_map = None
+        self.reference = None  # grey input at density resolution each tile was last computed from
+        self.tiles = None
+        self.regions = None
+        self.smoothed_count = None
+        self.frames_since_full = 0
+
+        self.frames = 0
+        self.full_frames = 0
+        self.tiles_recomputed = 0
+        self.tiles_reused = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def plan(self, width, height):
+        """Unpadded tiles and the same-sized padded crops they are computed from"""
+        self.tiles = plan_tiles(width, height, (self.tile_size, self.tile_size), 0, self.downsample)
+        self.regions = []
+        for x, y, w, h in self.tiles:
+            region_w, region_h = min(w + 2 * self.padding, width), min(h + 2 * self.padding, height)
+            # Shift crops at the borders inward instead of shrinking them, so they batch together
+            region_x = min(max(x - self.padding, 0), width - region_w)
+            region_y = min(max(y - self.padding, 0), height - region_h)
+            self.regions.append((region_x, region_y, region_w, region_h))
+
+    def changed_tiles(self, grey):
+        """Indices of tiles whose content moved away from the reference"""
+        changed = cv2.absdiff(grey, self.reference) > self.pixel_threshold
+        d = self.downsample
+        return [i for i, (x, y, w, h) in enumerate(self.tiles)
+                if changed[y // d:(y + h) // d, x // d:(x + w) // d].mean() > self.min_changed_fraction]
+
+    def update(self, image, predict_full, predict_regions):
+        """Density map for the next frame
+
+        `predict_full(image)` returns the density map of a whole frame and
+        `predict_regions(image, regions)` those of same-sized (x, y, w, h)
+        crops of it. Returns (summary, copy of the patched density map).
+        """
+        height, width = image.shape[:2]
+        d = self.downsample
+        grey = cv2.cvtColor(cv2.resize(image, (width // d, height // d), interpolation=cv2.INTER_AREA),
+                            cv2.COLOR_RGB2GRAY)
+
+        with self.lock:
+            self.last_used = time.monotonic()
+            full = (self.density_map is None or self.reference.shape != grey.shape
+                    or self.frames_since_full + 1 >= self.keyframe_interval)
+            changed = []
+            if not full:
+                changed = self.changed_tiles(grey)
+                full = len(changed) > self.full_refresh_fraction * len(self.tiles)
+
+            if full:
+                if self.reference is None or self.reference.shape != grey.shape:
+                    self.plan(width, height)
+                self.density_map = np.array(predict_full(image), dtype=np.float32)
+                self.reference = grey
+                self.frames_since_full = 0
+                self.full_frames += 1
+                recomputed = len(self.tiles)
+            else:
+                if changed:
+                    crops = predict_regions(image, [self.regions[i] for i in changed])
+                    for i, crop in zip(changed, crops):
+                        (x, y, w, h), (region_x, region_y, _, _) = self.tiles[i], self.regions[i]
+                        top, left = (y - region_y) // d, (x - region_x) // d
+                        tile = np.s_[y // d:(y + h) // d, x // d:(x + w) // d]
+                        self.density_map[tile] = crop[top:top + h // d, left:left + w // d]
+                        self.reference[tile] = grey[tile]
+                self.frames_since_full += 1
+                recomputed = len(changed)
+
+            self.frames += 1
+            self.tiles_recomputed += recomputed
+            self.tiles_reused += len(self.tiles) - recomputed
+
+            count = float(self.density_map.sum())
+            if self.smoothed_count is None:
+                self.smoothed_count = count
+            else:
+                self.smoothed_count = self.smoothing * self.smoothed_count + (1 - self.smoothing) * count
+
+            summary = {
+                'predicted_count': count,
+                'smoothed_count': self.smoothed_count,
+                'full_frame': full,
+                'tiles_recomputed': recomputed,
+                'tiles_total': len(self.tiles)
+            }
+            # The next frame patches the map in place
+            return summary, self.density_map.copy()
+
+    def stats(self):
+        with self.lock:
+            total = self.tiles_recomputed + self.tiles_reused
+            return {
+                'frames': self.frames,
+                'full_frames': self.full_frames,
+                'tiles_recomputed': self.tiles_recomputed,
+                'tiles_reused': self.tiles_reused,
+                'recompute_fraction': round(self.tiles_recomputed / total, 3) if total else None,
+                'smoothed_count': round(self.smoothed_count, 1) if self.smoothed_count is not None else None
+            }
+
+
+class SessionRegistry:
+    """Per-camera IncrementalDensity sessions, created on first use
+
+    Sessions idle for more than `idle_timeout` seconds are dropped, and the
+    least recently used one is dropped when `max_sessions` is reached.
+    """
+
+    def __init__(self, factory, max_sessions=64, idle_timeout=600):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id, create=True):
+        now = time.monotonic()
+        with self.lock:
+            for stale_id in [key for key, session in self.sessions.items()
+                             if now - session.last_used > self.idle_timeout]:
+                del self.sessions[stale_id]
+
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self.sessions.move_to_end(session_id)
+            elif create:
+                session = self.sessions[session_id] = self.factory()
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            return session
+
+    def delete(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self.lock:
+            return {'sessions': len(self.sessions), 'max_sessions': self.max_sessions,
+                    'idle_timeout_seconds': self.idle_timeout}
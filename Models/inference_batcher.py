@@ -0,0 +1,114 @@
+import threading
+import queue
+import time
+from concurrent.futures import Future
+
+
+class InferenceBatcher:
+    """Dynamic micro-batching scheduler in front of a model
+
+    Requests are collected for at most `max_latency_ms` (or until
+    `max_batch_size` are waiting), grouped by `key` so only compatible inputs
+    are stacked together, and handed to `run_batch` as one list. `run_batch`
+    must return one output per input, in order.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_latency_ms=10, key=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_latency = max(0.0, max_latency_ms / 1000.0)
+        self.key = key or (lambda item: tuple(item.shape))
+
+        self.q = queue.Queue()
+        self.running = False
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.update, name='inference-batcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, item):
+        """Queue one input and return a Future resolving to its output"""
+        if not self.running:
+            raise RuntimeError('Inference batcher is not running')
+        future = Future()
+        self.q.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        """Blocking helper: submit one input and wait for its output"""
+        return self.submit(item).result(timeout=timeout)
+
+    def update(self):
+        while self.running:
+            try:
+                first = self.q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self.q.get(timeout=remaining))
+                    else:
+                        batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+
+            self.run(batch)
+
+    def run(self, batch):
+        """Run each shape-compatible group of the batch as one forward pass"""
+        groups = {}
+        for item, future in batch:
+            if future.set_running_or_notify_cancel():
+                groups.setdefault(self.key(item), []).append((item, future))
+
+        for group in groups.values():
+            try:
+                outputs = self.run_batch([item for item, _ in group])
+            except Exception as e:
+                for _, future in group:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), output in zip(group, outputs):
+                future.set_result(output)
+
+            with self.lock:
+                self.batches += 1
+                self.items += len(group)
+                self.largest_batch = max(self.largest_batch, len(group))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'batches': self.batches,
+                'items': self.items,
+                'avg_batch_size': round(self.items / self.batches, 2) if self.batches else 0.0,
+                'largest_batch': self.largest_batch,
+                'queue_depth': self.q.qsize(),
+                'max_batch_size': self.max_batch_size,
+                'max_latency_ms': round(self.max_latency * 1000, 1)
+            }
+
+    def stop(self):
+        self.running = False
+        if hasattr(self, 'thread'):
+            self.thread.join()
+        # Fail anything still waiting so callers don't hang forever
+        while True:
+            try:
+                _, future = self.q.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError('Inference batcher stopped'))
@@ -0,0 +1,402 @@
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when max_queued jobs are already waiting"""
+
+
+class Job:
+    """One queued unit of work: an opaque payload plus JSON-serialisable params and result"""
+
+    def __init__(self, payload, params, priority=1, job_id=None, status=QUEUED, created_at=None,
+                 started_at=None, finished_at=None, expires_at=None, result=None, error=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.payload = payload
+        self.params = params
+        self.priority = priority
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.expires_at = expires_at
+        self.result = result
+        self.error = error
+
+    def to_dict(self):
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'priority': self.priority,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'expires_at': self.expires_at
+        }
+        if self.status == DONE:
+            info['result'] = self.result
+        elif self.status == FAILED:
+            info['error'] = self.error
+        return info
+
+
+class MemoryJobStore:
+    """In-process job store: a dict of jobs plus a (priority, created) heap of queued ids"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.heap = []
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+
+    def add(self, job):
+        with self.lock:
+            self.jobs[job.id] = job
+            heapq.heappush(self.heap, (job.priority, job.created_at, next(self.seq), job.id))
+
+    def claim(self, max_priority=None):
+        """Mark the most urgent queued job (priority <= max_priority) as running and return it"""
+        with self.lock:
+            while self.heap:
+                job = self.jobs.get(self.heap[0][-1])
+                if job is None or job.status != QUEUED:
+                    heapq.heappop(self.heap)
+                    continue
+                if max_priority is not None and job.priority > max_priority:
+                    return None
+                heapq.heappop(self.heap)
+                job.status = RUNNING
+                job.started_at = time.time()
+                return job
+            return None
+
+    def finish(self, job_id, status, result=None, error=None, expires_at=None):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            job.expires_at = expires_at
+            job.payload = None
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id, expires_at):
+        """Cancel a queued job; returns the job's status afterwards, or None if unknown"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                job.expires_at = expires_at
+                job.payload = None
+            return job.status
+
+    def position(self, job_id):
+        """Number of queued jobs that will run before this one"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return None
+            key = (job.priority, job.created_at)
+            return sum(1 for other in self.jobs.values()
+                       if other.status == QUEUED and (other.priority, other.created_at) < key)
+
+    def purge(self, now):
+        """Drop finished jobs whose results have expired"""
+        with self.lock:
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job.status in FINISHED and job.expires_at is not None and job.expires_at <= now]
+            for job_id in expired:
+                del self.jobs[job_id]
+            return len(expired)
+
+    def renew(self, job_ids):
+        """Running jobs live and die with this process, so there is no lease to extend"""
+
+    def counts(self):
+        with self.lock:
+            counts = dict.fromkeys((QUEUED, RUNNING) + FINISHED, 0)
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+class SqliteJobStore:
+    """SQLite-backed job store; survives restarts and can be shared by several processes
+
+    Claims run in an IMMEDIATE transaction, so concurrent workers (threads or
+    serve_density.py processes) never pick up the same job. A claim holds a
+    lease of `lease_seconds`, extended by the owning JobQueue while the job
+    runs; running jobs whose lease ran out (their process died or was
+    restarted) are put back in the queue by the next claim.
+    """
+    COLUMNS = ('id', 'payload', 'params', 'priority', 'status', 'created_at', 'started_at',
+               'finished_at', 'expires_at', 'result', 'error')
+
+    def __init__(self, path, lease_seconds=60):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, payload BLOB, params TEXT, priority INTEGER, status TEXT,
+                created_at REAL, started_at REAL, finished_at REAL, expires_at REAL, result TEXT, error TEXT)''')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created_at)')
+            if 'lease_until' not in [column[1] for column in conn.execute('PRAGMA table_info(jobs)')]:
+                conn.execute('ALTER TABLE jobs ADD COLUMN lease_until REAL')
+
+    def connect(self):
+        """One connection per thread"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def to_job(self, row):
+        values = dict(zip(self.COLUMNS, row))
+        return Job(
+            values['payload'], json.loads(values['params']), values['priority'], job_id=values['id'],
+            status=values['status'], created_at=values['created_at'], started_at=values['started_at'],
+            finished_at=values['finished_at'], expires_at=values['expires_at'],
+            result=json.loads(values['result']) if values['result'] is not None else None,
+            error=values['error']
+        )
+
+    def add(self, job):
+        self.connect().execute(
+            'INSERT INTO jobs (id, payload, params, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (job.id, job.payload, json.dumps(job.params), job.priority, job.status, job.created_at)
+        )
+
+    def claim(self, max_priority=None):
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            # Requeue jobs of workers that stopped renewing their lease (NULL: claimed before leases existed)
+            conn.execute('''UPDATE jobs SET status = ?, started_at = NULL, lease_until = NULL
+                            WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)''',
+                         (QUEUED, RUNNING, now))
+            query = f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status = ?"
+            args = [QUEUED]
+            if max_priority is not None:
+                query += ' AND priority <= ?'
+                args.append(max_priority)
+            row = conn.execute(query + ' ORDER BY priority, created_at LIMIT 1', args).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            job = self.to_job(row)
+            job.status = RUNNING
+            job.started_at = now
+            conn.execute('UPDATE jobs SET status = ?, started_at = ?, lease_until = ? WHERE id = ?',
+                         (RUNNING, job.started_at, now + self.lease_seconds, job.id))
+            conn.execute('COMMIT')
+            return job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def renew(self, job_ids):
+        """Extend the lease of running jobs still being worked on"""
+        if not job_ids:
+            return
+        job_ids = list(job_ids)
+        self.connect().execute(
+            f"UPDATE jobs SET lease_until = ? WHERE status = ? AND id IN ({', '.join('?' * len(job_ids))})",
+            (time.time() + self.lease_seconds, RUNNING, *job_ids)
+        )
+
+    def finish(self, job_id, status, result=None, error=None, expires_at=None):
+        self.connect().execute(
+            '''UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ?, payload = NULL
+               WHERE id = ? AND status NOT IN (?, ?, ?)''',
+            (status, json.dumps(result) if result is not None else None, error, time.time(), expires_at,
+             job_id, *FINISHED)
+        )
+
+    def get(self, job_id):
+        row = self.connect().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return self.to_job(row) if row is not None else None
+
+    def cancel(self, job_id, expires_at):
+        conn = self.connect()
+        conn.execute(
+            'UPDATE jobs SET status = ?, finished_at = ?, expires_at = ?, payload = NULL WHERE id = ? AND status = ?',
+            (CANCELLED, time.time(), expires_at, job_id, QUEUED)
+        )
+        row = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def position(self, job_id):
+        conn = self.connect()
+        row = conn.execute('SELECT priority, created_at, status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or row[2] != QUEUED:
+            return None
+        return conn.execute(
+            'SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority < ? OR (priority = ? AND created_at < ?))',
+            (QUEUED, row[0], row[0], row[1])
+        ).fetchone()[0]
+
+    def purge(self, now):
+        cursor = self.connect().execute(
+            f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND expires_at <= ?",
+            (*FINISHED, now)
+        )
+        return cursor.rowcount
+
+    def counts(self):
+        counts = dict.fromkeys((QUEUED, RUNNING) + FINISHED, 0)
+        for status, count in self.connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'):
+            counts[status] = count
+        return counts
+
+
+class JobQueue:
+    """Priority job queue drained by a local pool of worker threads
+
+    `handler(job)` returns a JSON-serialisable result; exceptions mark the job
+    failed. Lower priority numbers run first, and the first
+    `reserved_workers` threads only take jobs with priority <= `reserved_priority`
+    so short jobs are never stuck behind a backlog of big ones. Finished
+    results are kept for `result_ttl` seconds. With a store that leases
+    claims, a background thread renews the lease of jobs running here.
+    """
+
+    def __init__(self, handler, store=None, workers=2, reserved_workers=0, reserved_priority=0,
+                 result_ttl=600, max_queued=256, poll_interval=0.5):
+        self.handler = handler
+        self.store = store or MemoryJobStore()
+        self.workers = max(1, int(workers))
+        self.reserved_workers = min(max(0, int(reserved_workers)), self.workers - 1)
+        self.reserved_priority = reserved_priority
+        self.result_ttl = result_ttl
+        self.max_queued = max_queued
+        self.poll_interval = poll_interval
+
+        self.cond = threading.Condition()
+        self.running = False
+        self.threads = []
+        self.active = set()  # ids of jobs running on this queue's workers
+        self.completed = 0
+        self.failed = 0
+        self.last_purge = 0.0
+
+    def start(self):
+        self.running = True
+        for i in range(self.workers):
+            max_priority = self.reserved_priority if i < self.reserved_workers else None
+            thread = threading.Thread(target=self.update, args=(max_priority,), name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if getattr(self.store, 'lease_seconds', None):
+            thread = threading.Thread(target=self.renew_leases, name='job-leases', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def submit(self, payload, params, priority=1):
+        """Queue a job and return its id"""
+        if not self.running:
+            raise RuntimeError('Job queue is not running')
+        if self.max_queued and self.store.counts()[QUEUED] >= self.max_queued:
+            raise QueueFull(f'{self.max_queued} jobs are already queued')
+        job = Job(payload, params, priority)
+        self.store.add(job)
+        with self.cond:
+            self.cond.notify_all()
+        return job.id
+
+    def get(self, job_id):
+        """Job status dict (with the result once done), or None if unknown or expired"""
+        job = self.store.get(job_id)
+        if job is None or (job.expires_at is not None and job.expires_at <= time.time()):
+            return None
+        info = job.to_dict()
+        if job.status == QUEUED:
+            info['queue_position'] = self.store.position(job_id)
+        return info
+
+    def cancel(self, job_id):
+        """Cancel a queued job; returns its status afterwards (running jobs are not interrupted)"""
+        return self.store.cancel(job_id, time.time() + self.result_ttl)
+
+    def update(self, max_priority):
+        while self.running:
+            self.purge()
+            job = self.store.claim(max_priority)
+            if job is None:
+                with self.cond:
+                    self.cond.wait(self.poll_interval)
+                continue
+
+            with self.cond:
+                self.active.add(job.id)
+            try:
+                result = self.handler(job)
+                self.store.finish(job.id, DONE, result=result, expires_at=time.time() + self.result_ttl)
+                self.completed += 1
+            except Exception as e:
+                self.store.finish(job.id, FAILED, error=str(e), expires_at=time.time() + self.result_ttl)
+                self.failed += 1
+            finally:
+                with self.cond:
+                    self.active.discard(job.id)
+
+    def renew_leases(self):
+        # Renew well before expiry so one slow database write does not lose a lease
+        interval = self.store.lease_seconds / 3
+        while self.running:
+            with self.cond:
+                self.cond.wait(interval)
+                active = list(self.active)
+            try:
+                self.store.renew(active)
+            except Exception as e:
+                print(f"⚠️ Could not renew job leases: {e}")
+
+    def purge(self):
+        now = time.time()
+        if now - self.last_purge >= 30:
+            self.last_purge = now
+            self.store.purge(now)
+
+    def stats(self):
+        return {
+            'store': type(self.store).__name__,
+            'workers': self.workers,
+            'reserved_workers': self.reserved_workers,
+            'jobs': self.store.counts(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'result_ttl_seconds': self.result_ttl
+        }
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=5.0)
@@ -0,0 +1,189 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond stages up to long monitoring calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Stage timings of the request being handled, if any (see StageTimings.activate)
+current_timings = contextvars.ContextVar('current_timings', default=None)
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, format_labels(self.labelnames, key), value) for key, value in self.values.items()]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (seconds) with optional labels"""
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.values = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        out = []
+        with self.lock:
+            for key, entry in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry):
+                    cumulative += count
+                    labels = format_labels(self.labelnames, key, [('le', format_value(bound))])
+                    out.append((f'{self.name}_bucket', labels, cumulative))
+                labels = format_labels(self.labelnames, key)
+                out.append((f'{self.name}_sum', labels, entry[-2]))
+                out.append((f'{self.name}_count', labels, entry[-1]))
+        return out
+
+
+class Callback:
+    """Metric read at scrape time from `fn`, which returns a number or {label value tuple: number}"""
+
+    def __init__(self, name, help, fn, type='gauge', labelnames=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.type = type
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if isinstance(value, dict):
+            return [(self.name, format_labels(self.labelnames, key if isinstance(key, tuple) else (key,)), v)
+                    for key, v in value.items()]
+        return [(self.name, '', value)]
+
+
+class MetricsRegistry:
+    """Named metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.metrics = []
+
+    def add(self, metric):
+        metric.name = self.prefix + metric.name
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.add(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, fn, type='gauge', labelnames=()):
+        return self.add(Callback(name, help, fn, type, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimings:
+    """Per-request stage durations, for the Server-Timing header
+
+    Stages that repeat within a request (one per video frame, say) are
+    summed. activate() makes this the target of timed() in the current
+    context (thread or asyncio task) until the returned token is reset.
+    """
+
+    def __init__(self):
+        self.stages = {}  # stage -> [total seconds, count]
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()  # stages of a request can run on several worker threads
+
+    def activate(self):
+        return current_timings.set(self)
+
+    def add(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def header(self):
+        """Server-Timing value: one entry per stage (ms), plus the total so far"""
+        with self.lock:
+            parts = [f'{stage};dur={total * 1000:.2f}' + (f';desc="x{count}"' if count > 1 else '')
+                     for stage, (total, count) in self.stages.items()]
+        parts.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.2f}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def timed(histogram, stage):
+    """Time a block into histogram{stage=...} and the active request's StageTimings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, stage=stage)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add(stage, elapsed)
@@ -0,0 +1,163 @@
+import copy
+import os
+
+import numpy as np
+import torch
+
+BACKENDS = ('eager', 'torchscript', 'onnx')
+# Eager execution variants; int8 models are produced by quantize_model.py and
+# loaded through the torchscript backend
+PRECISION_MODES = ('fp32', 'channels_last', 'bf16')
+
+
+def backend_for_path(model_path):
+    """Guess the inference backend from a model file extension"""
+    ext = os.path.splitext(model_path)[1].lower()
+    if ext == '.onnx':
+        return 'onnx'
+    if ext in ('.pt', '.ts', '.torchscript'):
+        return 'torchscript'
+    return 'eager'
+
+
+def bf16_supported():
+    """Whether this CPU has native bfloat16 kernels (AVX512-BF16 / AMX)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+class EagerBackend:
+    """Plain PyTorch nn.Module execution, optionally channels_last or bf16 autocast"""
+
+    def __init__(self, module, device='cpu', precision='fp32'):
+        if precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown precision '{precision}', expected one of: {', '.join(PRECISION_MODES)}")
+        self.device_type = 'cuda' if str(device).startswith('cuda') else 'cpu'
+        if precision == 'bf16' and self.device_type == 'cpu' and not bf16_supported():
+            raise RuntimeError('bf16 autocast requested but this CPU has no native bfloat16 support')
+
+        # bf16 convolutions in oneDNN also want NHWC
+        self.memory_format = torch.contiguous_format if precision == 'fp32' else torch.channels_last
+        self.autocast = precision == 'bf16'
+        self.module = module.to(device).eval().to(memory_format=self.memory_format)
+        self.device = device
+        self.precision = precision
+        self.name = 'eager' if precision == 'fp32' else f'eager-{precision}'
+
+    def __call__(self, batch):
+        batch = batch.to(self.device, non_blocking=True).contiguous(memory_format=self.memory_format)
+        with torch.inference_mode(), torch.autocast(self.device_type, dtype=torch.bfloat16, enabled=self.autocast):
+            return self.module(batch).float().cpu().numpy()
+
+
+class TorchScriptBackend:
+    """Frozen TorchScript graph produced by export_torchscript"""
+    name = 'torchscript'
+
+    def __init__(self, model_path, device='cpu'):
+        self.module = torch.jit.load(model_path, map_location=device).eval()
+        self.device = device
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            return self.module(batch.to(self.device, non_blocking=True)).cpu().numpy()
+
+
+class OnnxBackend:
+    """ONNX Runtime session; intra-op threads follow torch.get_num_threads()"""
+    name = 'onnx'
+
+    def __init__(self, model_path, device='cpu', num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("ONNX backend requires onnxruntime (pip install onnxruntime)")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or torch.get_num_threads()
+        options.inter_op_num_threads = 1
+
+        providers = ['CPUExecutionProvider']
+        if device == 'cuda' and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+
+        self.session = ort.InferenceSession(model_path, options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.device = device
+
+    def __call__(self, batch):
+        inputs = np.ascontiguousarray(batch.detach().cpu().numpy(), dtype=np.float32)
+        return self.session.run(None, {self.input_name: inputs})[0]
+
+
+def create_backend(backend, model_path, build_module=None, device='cpu', precision='fp32'):
+    """Instantiate an inference backend
+
+    `build_module` and `precision` are only used by the eager backend:
+    build_module must return the nn.Module with the checkpoint at model_path
+    already loaded.
+    """
+    if backend == 'eager':
+        return EagerBackend(build_module(model_path), device, precision)
+    if backend == 'torchscript':
+        return TorchScriptBackend(model_path, device)
+    if backend == 'onnx':
+        return OnnxBackend(model_path, device)
+    raise ValueError(f"Unknown backend '{backend}', expected one of: {', '.join(BACKENDS)}")
+
+
+def export_torchscript(module, path, example, optimize=True):
+    """Trace, freeze and save a TorchScript version of the model"""
+    module = module.eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(module, example)
+    frozen = torch.jit.freeze(traced)
+    if optimize:
+        frozen = torch.jit.optimize_for_inference(frozen)
+    torch.jit.save(frozen, path)
+    return path
+
+
+def use_explicit_padding(module):
+    """Replace padding='same' with the equivalent numeric padding (odd kernels only)
+
+    Quantized convolutions do not accept string padding.
+    """
+    for conv in module.modules():
+        if isinstance(conv, torch.nn.Conv2d) and conv.padding == 'same':
+            if any(k % 2 == 0 for k in conv.kernel_size) or any(d != 1 for d in conv.dilation):
+                raise ValueError(f'Cannot convert same padding for {conv}')
+            conv.padding = tuple(k // 2 for k in conv.kernel_size)
+    return module
+
+
+def quantize_static_int8(module, calibration_batches, example, engine='x86'):
+    """Post-training static int8 quantization (FX graph mode) calibrated on sample batches"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = engine
+    module = use_explicit_padding(copy.deepcopy(module).cpu().eval())
+    prepared = prepare_fx(module, get_default_qconfig_mapping(engine), (example,))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def export_onnx(module, path, example, opset=17):
+    """Export an ONNX graph with dynamic batch, height and width"""
+    dynamic_axes = {
+        'image': {0: 'batch', 2: 'height', 3: 'width'},
+        'density': {0: 'batch', 2: 'density_height', 3: 'density_width'}
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            module.eval(), example, path,
+            input_names=['image'], output_names=['density'],
+            dynamic_axes=dynamic_axes, opset_version=opset, do_constant_folding=True
+        )
+    return path
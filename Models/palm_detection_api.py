@@ -1,20 +1,84 @@
-from fastapi import FastAPI, HTTPException
+import time
+# Taken before the heavy imports so /ready reports the whole cold start
+PROCESS_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 import cv2
 import mediapipe as mp
 import numpy as np
 import base64
 import threading
-import queue
-import time
 import asyncio
-from typing import Optional
-import io
-from PIL import Image
+import json
+import os
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from camera_streams import StreamRegistry
+from frame_sampling import SAMPLERS, create_sampler
+from hand_geometry import bounding_boxes, hands_from_results, palm_open
+from metrics import CONTENT_TYPE, MetricsRegistry, StageTimings, current_timings, timed
 
 app = FastAPI(title="Palm Detection API", version="1.0.0")
 
+# One shared reader per camera URL; idle streams close after this many seconds
+STREAM_IDLE_TIMEOUT = 30.0
+# Maximum time to wait for the first frame of a camera that is not yet streaming
+CONNECT_TIMEOUT = 5.0
+stream_registry = StreamRegistry(idle_timeout=STREAM_IDLE_TIMEOUT)
+
+# MediaPipe Hands pool: sensitivities are rounded to SENSITIVITY_STEP buckets,
+# each holding up to DETECTORS_PER_BUCKET warm instances
+DETECTORS_PER_BUCKET = 4
+SENSITIVITY_STEP = 0.05
+PREWARM_SENSITIVITIES = (0.7,)
+DETECTOR_ACQUIRE_TIMEOUT = 30.0
+
+# Each prewarmed detector runs MediaPipe once on a blank frame of this size
+# (graph and interpreter initialisation) before /ready reports ready
+WARMUP_FRAME_SIZE = (640, 480)
+startup = {
+    'ready': False,
+    'import_seconds': round(time.perf_counter() - PROCESS_STARTED, 3),
+    'warmup_seconds': None,
+    'startup_seconds': None
+}
+
+# Frame inference runs on a bounded worker pool off the event loop. When more
+# than FRAME_QUEUE_LIMIT frames are pending, detection loops skip frames
+# instead of queueing them; requests beyond MAX_CONCURRENT_DETECTIONS get a 503
+FRAME_WORKERS = min(8, os.cpu_count() or 4)
+FRAME_QUEUE_LIMIT = FRAME_WORKERS * 2
+MAX_CONCURRENT_DETECTIONS = 64
+
+# Continuous alert streams (WebSocket / SSE) each hold a detector for their
+# whole lifetime, so they have their own limit and their own detector pool:
+# open streams never starve one-shot requests of detectors
+MAX_ALERT_STREAMS = 32
+
+# Multi-camera sweeps: cameras per batch request. Sweeps share static-image
+# detectors (no tracking state) checked out per frame, one per frame worker
+MAX_BATCH_CAMERAS = 64
+SWEEP_DETECTORS_PER_BUCKET = FRAME_WORKERS
+ALERT_HEARTBEAT_SECONDS = 5.0
+
+# Prometheus metrics at /metrics. Requests that send 'X-Server-Timing: 1'
+# (or ?server_timing=1) get their stage timings in a Server-Timing header
+SERVER_TIMING = True
+metrics_registry = MetricsRegistry(prefix='palm_')
+stage_seconds = metrics_registry.histogram('stage_seconds', 'Time spent in each detection stage', ('stage',))
+request_seconds = metrics_registry.histogram('request_seconds', 'Request latency by route', ('endpoint',))
+requests_total = metrics_registry.counter('requests_total', 'Requests by route and status', ('endpoint', 'status'))
+request_errors_total = metrics_registry.counter(
+    'request_errors_total', 'Requests answered with a 4xx or 5xx status', ('endpoint', 'status'))
+frames_total = metrics_registry.counter(
+    'frames_total', 'Camera frames by outcome (read, inferred, skipped)', ('outcome',))
+
 
 # Add CORS middleware
 app.add_middleware(
@@ -34,6 +98,8 @@ class PalmDetectionRequest(BaseModel):
     ip_address: str
     timeout: Optional[int] = 10  # Maximum time to wait for detection
     detection_sensitivity: Optional[float] = 0.7
+    sampling: Optional[str] = "adaptive"  # 'adaptive' (motion-gated) or 'every_nth' (every 3rd frame)
+    target_fps: Optional[float] = None  # inference budget for adaptive sampling (default: 10)
 
 class PalmDetectionResponse(BaseModel):
     success: bool
@@ -42,96 +108,145 @@ class PalmDetectionResponse(BaseModel):
     detection_count: int
     processed_frame: Optional[str] = None  # base64 encoded image
     timestamp: str
+    frames_read: int = 0
+    frames_inferred: int = 0
 
-class VideoStream:
-    """Optimized video streaming class for IP cameras"""
-    def __init__(self, src):
-        self.cap = cv2.VideoCapture(src)
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        self.cap.set(cv2.CAP_PROP_FPS, 30)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        
-        self.q = queue.Queue(maxsize=2)
-        self.running = True
-        self.connected = False
-        
-    def start(self):
-        self.thread = threading.Thread(target=self.update)
-        self.thread.start()
-        return self
-        
-    def update(self):
-        while self.running:
-            ret, frame = self.cap.read()
-            if not ret:
-                break
-                
-            self.connected = True
-            
-            # Clear queue if it's full (drop old frames)
-            if not self.q.empty():
-                try:
-                    self.q.get_nowait()
-                except queue.Empty:
-                    pass
-            
-            self.q.put(frame)
-            
-    def read(self):
+class BatchPalmDetectionRequest(BaseModel):
+    ip_addresses: List[str]
+    timeout: Optional[float] = 10  # Shared deadline for the whole sweep
+    detection_sensitivity: Optional[float] = 0.7
+    sampling: Optional[str] = "adaptive"
+    target_fps: Optional[float] = None
+    stream: Optional[bool] = False  # Stream per-camera results as NDJSON as they complete
+
+class CameraDetectionResult(PalmDetectionResponse):
+    ip_address: str
+
+class BatchPalmDetectionResponse(BaseModel):
+    success: bool
+    camera_count: int
+    palm_detected: bool
+    cameras_with_palm: List[str]
+    elapsed_seconds: float
+    results: List[CameraDetectionResult]
+    timestamp: str
+
+class FrameProcessor:
+    """Bounded thread pool for MediaPipe inference and encoding, with back-pressure
+
+    MediaPipe and OpenCV release the GIL for most of their work, so frames
+    from many cameras are processed in parallel while the event loop stays
+    free for other requests.
+    """
+    
+    def __init__(self, workers, max_pending):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='palm-frame')
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+    
+    async def run(self, fn, *args, drop_if_busy=False):
+        """Run fn(*args) on the pool; with drop_if_busy, return None instead of queueing when saturated"""
+        with self.lock:
+            if drop_if_busy and self.pending >= self.max_pending:
+                self.skipped += 1
+                return None
+            self.pending += 1
         try:
-            return self.q.get(timeout=1.0)
-        except queue.Empty:
-            return None
-            
-    def stop(self):
-        self.running = False
-        if hasattr(self, 'thread'):
-            self.thread.join()
-        self.cap.release()
+            # Carry the request context over so timed() stages reach its Server-Timing
+            context = contextvars.copy_context()
+            future = self.executor.submit(context.run, fn, *args)
+            result = asyncio.wrap_future(future)
+            try:
+                return await asyncio.shield(result)
+            except asyncio.CancelledError:
+                # A frame already running still owns its detector: let it finish before the
+                # caller unwinds and releases the detector to another request
+                if not future.cancel():
+                    while not result.done():
+                        try:
+                            await asyncio.wait([result])
+                        except asyncio.CancelledError:
+                            pass
+                    if not result.cancelled():
+                        result.exception()
+                raise
+        finally:
+            with self.lock:
+                self.pending -= 1
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'pending': self.pending,
+                'max_pending': self.max_pending,
+                'skipped_frames': self.skipped
+            }
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+frame_processor = FrameProcessor(FRAME_WORKERS, FRAME_QUEUE_LIMIT)
+detection_slots = asyncio.Semaphore(MAX_CONCURRENT_DETECTIONS)
+
+metrics_registry.callback('frame_pool_pending', 'Frames queued or running on the inference pool',
+                          lambda: frame_processor.stats()['pending'])
+metrics_registry.callback('frame_pool_skipped_total', 'Frames skipped because the inference pool was saturated',
+                          lambda: frame_processor.stats()['skipped_frames'], type='counter')
 
 class PalmDetectionAPI:
     """API version of Palm Detection"""
     
-    def __init__(self, detection_confidence=0.7):
+    def __init__(self, detection_confidence=0.7, static_image_mode=False):
+        self.detection_confidence = detection_confidence
         # Initialize MediaPipe
         self.mp_hands = mp.solutions.hands
         self.hands = self.mp_hands.Hands(
-            static_image_mode=False,
+            static_image_mode=static_image_mode,
             max_num_hands=2,
             min_detection_confidence=detection_confidence,
             min_tracking_confidence=0.5
         )
         self.mp_draw = mp.solutions.drawing_utils
+        self.camera = None  # camera URL whose hands the tracker last followed (see DetectorPool)
+        self.last_hand_count = 0
+        self.last_palm_boxes = []
+        self.last_results = None
         
-    def is_palm_open(self, landmarks):
-        """Detect if palm is open by checking finger positions"""
-        finger_tips = [4, 8, 12, 16, 20]  # Thumb, Index, Middle, Ring, Pinky tips
-        finger_pips = [3, 6, 10, 14, 18]  # Corresponding PIP joints
-        
-        fingers_up = 0
+        # Reused frame buffers: MediaPipe input (two, swapped so a torn read
+        # never clobbers the last good frame), annotation output and banner
+        self.rgb_buffer = None
+        self.spare_buffer = None
+        self.annotated_buffer = None
+        self.banner_buffer = None
         
-        # Check thumb
-        if landmarks[finger_tips[0]].x > landmarks[finger_pips[0]].x:
-            fingers_up += 1
-            
-        # Check other four fingers
-        for i in range(1, 5):
-            if landmarks[finger_tips[i]].y < landmarks[finger_pips[i]].y:
-                fingers_up += 1
-                
-        return fingers_up >= 4
+    def reset_tracking(self):
+        """Forget tracked hands, so landmarks from one camera never seed detection on another"""
+        self.hands.reset()
+        self.last_results = None
+        self.last_hand_count = 0
+        self.last_palm_boxes = []
+    
+    def warm_up(self, frame_size=(640, 480)):
+        """Run MediaPipe once on a blank frame so the first real frame does not pay graph initialisation"""
+        width, height = frame_size
+        self.detect(np.zeros((height, width, 3), dtype=np.uint8))
+        self.reset_tracking()
     
     def draw_detection_overlay(self, frame, detection_count):
-        """Draw detection overlay on frame"""
+        """Draw detection overlay on frame (in place; only the banner rows are blended)"""
         height, width = frame.shape[:2]
+        banner = frame[:80]
         
-        # Create warning overlay
-        overlay = frame.copy()
-        
-        # Warning banner
+        # Warning banner, drawn into a reused buffer the size of the banner rows
+        if self.banner_buffer is None or self.banner_buffer.shape != banner.shape:
+            self.banner_buffer = np.empty_like(banner)
+        overlay = self.banner_buffer
         warning_color = (0, 100, 255)  # Orange-red
-        cv2.rectangle(overlay, (0, 0), (width, 80), warning_color, -1)
+        overlay[:] = warning_color
         
         # Warning text
         warning_text = "🚨 PALM DETECTED! 🚨"
@@ -151,155 +266,364 @@ class PalmDetectionAPI:
         counter_text = f"Detections: {detection_count}"
         cv2.putText(overlay, counter_text, (20, 70), font, 0.6, (255, 255, 255), 2)
         
-        # Blend overlay
+        # Blend overlay; rows below the banner would blend with themselves, so they are left alone
         alpha = 0.8
-        frame = cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0)
+        cv2.addWeighted(overlay, alpha, banner, 1 - alpha, 0, dst=banner)
         
         return frame
     
-    def process_frame(self, frame):
-        """Process single frame for palm detection"""
-        # Convert BGR to RGB for MediaPipe
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.hands.process(rgb_frame)
+    def detect(self, frame, still_valid=None):
+        """Run MediaPipe on a BGR frame without modifying or copying it
         
-        palm_detected = False
-        detection_count = 0
+        The frame is colour-converted into a reusable RGB buffer that also
+        serves as the snapshot annotate() renders from, so shared stream
+        frames can be passed directly. Returns None when `still_valid`
+        reports the frame was overwritten while it was being converted.
+        """
+        converted = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.spare_buffer)
+        if still_valid is not None and not still_valid():
+            # Torn read: keep the previous snapshot intact
+            self.spare_buffer = converted
+            return None
+        self.spare_buffer, self.rgb_buffer = self.rgb_buffer, converted
         
-        if results.multi_hand_landmarks:
-            for hand_landmarks in results.multi_hand_landmarks:
-                # Draw hand landmarks
-                self.mp_draw.draw_landmarks(
-                    frame, hand_landmarks, self.mp_hands.HAND_CONNECTIONS,
-                    self.mp_draw.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
-                    self.mp_draw.DrawingSpec(color=(255, 0, 0), thickness=2)
-                )
-                
-                # Check if palm is open
-                if self.is_palm_open(hand_landmarks.landmark):
-                    palm_detected = True
-                    detection_count += 1
-                    
-                    # Draw bounding box around detected palm
-                    h, w, c = frame.shape
-                    cx_min = int(min([lm.x for lm in hand_landmarks.landmark]) * w)
-                    cy_min = int(min([lm.y for lm in hand_landmarks.landmark]) * h)
-                    cx_max = int(max([lm.x for lm in hand_landmarks.landmark]) * w)
-                    cy_max = int(max([lm.y for lm in hand_landmarks.landmark]) * h)
-                    
-                    # Draw bright green bounding box
-                    cv2.rectangle(frame, (cx_min-10, cy_min-10), (cx_max+10, cy_max+10), (0, 255, 0), 3)
-                    cv2.putText(frame, 'OPEN PALM!', (cx_min, cy_min-20), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        # A read-only array is passed to MediaPipe by reference instead of copied
+        self.rgb_buffer.flags.writeable = False
+        try:
+            with timed(stage_seconds, 'mediapipe'):
+                results = self.hands.process(self.rgb_buffer)
+        finally:
+            self.rgb_buffer.flags.writeable = True
         
-        return frame, palm_detected, detection_count
+        # Landmarks are converted once per hand; classification and boxes run on the whole batch
+        landmarks = hands_from_results(results)
+        height, width = self.rgb_buffer.shape[:2]
+        open_palms = palm_open(landmarks, aspect=width / height)
+        self.last_results = results
+        self.last_hand_count = len(landmarks)
+        self.last_palm_boxes = bounding_boxes(landmarks[open_palms], width, height).tolist()
+        return {
+            'palm_detected': bool(self.last_palm_boxes),
+            'detection_count': len(self.last_palm_boxes),
+            'hand_count': self.last_hand_count,
+            'palm_boxes': self.last_palm_boxes
+        }
     
-    def frame_to_base64(self, frame):
-        """Convert OpenCV frame to base64 string"""
-        # Convert BGR to RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Convert to PIL Image
-        pil_image = Image.fromarray(frame_rgb)
+    def draw_hands(self, frame):
+        """Draw the landmarks and open-palm boxes found by the last detect() onto frame"""
+        for hand_landmarks in self.last_results.multi_hand_landmarks or []:
+            self.mp_draw.draw_landmarks(
+                frame, hand_landmarks, self.mp_hands.HAND_CONNECTIONS,
+                self.mp_draw.DrawingSpec(color=(0, 255, 0), thickness=2, circle_radius=2),
+                self.mp_draw.DrawingSpec(color=(255, 0, 0), thickness=2)
+            )
         
-        # Save to bytes
-        buffer = io.BytesIO()
-        pil_image.save(buffer, format='JPEG', quality=85)
-        
-        # Encode to base64
-        img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        for cx_min, cy_min, cx_max, cy_max in self.last_palm_boxes:
+            # Draw bright green bounding box
+            cv2.rectangle(frame, (cx_min-10, cy_min-10), (cx_max+10, cy_max+10), (0, 255, 0), 3)
+            cv2.putText(frame, 'OPEN PALM!', (cx_min, cy_min-20), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        return frame
+    
+    def annotate(self, detection_count=0):
+        """Annotated BGR copy of the last detected frame, rendered into a reused buffer
         
-        return img_base64
+        Only frames that are actually returned to clients are annotated; the
+        result is overwritten by the next call.
+        """
+        if self.last_results is None:
+            return None
+        frame = cv2.cvtColor(self.rgb_buffer, cv2.COLOR_RGB2BGR, dst=self.annotated_buffer)
+        self.annotated_buffer = frame
+        self.draw_hands(frame)
+        if self.last_palm_boxes:
+            self.draw_detection_overlay(frame, detection_count)
+        return frame
+    
+    def render_jpeg(self, detection_count=0):
+        """annotate() + frame_to_base64() in one step (runs on the frame pool)"""
+        frame = self.annotate(detection_count)
+        return self.frame_to_base64(frame) if frame is not None else None
+    
+    def frame_to_base64(self, frame, quality=85):
+        """Convert OpenCV frame to base64 JPEG string"""
+        # cv2 encodes BGR directly: no RGB conversion or PIL round trip
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return base64.b64encode(buffer).decode('utf-8')
     
-    async def detect_palm_from_ip(self, ip_address: str, timeout: int = 10):
+    def detect_and_snapshot(self, frame, still_valid=None):
+        """detect() plus a BGR copy of the frame it ran on, for detectors shared between cameras"""
+        result = self.detect(frame, still_valid)
+        if result is None:
+            return None, None
+        return result, cv2.cvtColor(self.rgb_buffer, cv2.COLOR_RGB2BGR)
+    
+    def detect_and_render(self, frame, detection_count=0):
+        """detect() + render_jpeg() on a frame snapshot (runs on the frame pool)"""
+        self.detect(frame)
+        return self.render_jpeg(detection_count)
+    
+    @contextlib.asynccontextmanager
+    async def checkout(self, timeout=None):
+        """This detector for every frame (see monitor_camera)"""
+        yield self
+    
+    async def detect_palm_from_ip(self, ip_address: str, timeout: float = 10, sampling: str = "adaptive",
+                                  target_fps: Optional[float] = None, connect_timeout: Optional[float] = None):
         """Main detection function for API"""
-        video_stream = None
+        return await monitor_camera(ip_address, self.checkout, timeout, sampling, target_fps, connect_timeout)
+
+async def monitor_camera(ip_address, checkout, timeout=10, sampling="adaptive", target_fps=None,
+                         connect_timeout=None, shared=False):
+    """Watch one camera until an open palm is seen or `timeout` seconds pass
+
+    `checkout(timeout)` is an async context manager yielding the detector
+    for one frame. With shared=False it is always the same tracking
+    detector, so the last detected frame can be rendered at the end. With
+    shared=True detectors are static-image ones handed round between
+    cameras per frame: a palm is rendered under the checkout that found it,
+    and otherwise a snapshot of the last inferred frame is re-detected and
+    rendered at the end.
+    """
+    video_stream = None
+    
+    try:
+        sampler = create_sampler(sampling, target_fps)
+
+        # Subscribe to the shared stream; only the first subscriber pays the connect time
+        video_stream = stream_registry.subscribe(ip_address)
+        with timed(stage_seconds, 'connect'):
+            connected = await video_stream.wait_connected_async(
+                CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+            )
         
-        try:
-            # Initialize video stream
-            video_stream = VideoStream(ip_address).start()
-            
-            # Wait for connection
-            await asyncio.sleep(2.0)
-            
-            if not video_stream.connected:
-                return {
-                    "success": False,
-                    "palm_detected": False,
-                    "message": f"Failed to connect to IP camera: {ip_address}",
-                    "detection_count": 0,
-                    "processed_frame": None,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-            
-            start_time = time.time()
-            frame_count = 0
-            total_detections = 0
-            last_processed_frame = None
-            palm_detected_overall = False
-            
-            while time.time() - start_time < timeout:
-                frame = video_stream.read()
-                if frame is None:
-                    await asyncio.sleep(0.1)
-                    continue
-                
-                frame_count += 1
-                
-                # Process every 3rd frame for better performance
-                if frame_count % 3 == 0:
-                    processed_frame, palm_detected, detection_count = self.process_frame(frame.copy())
-                    
-                    if palm_detected:
-                        palm_detected_overall = True
-                        total_detections += detection_count
-                        processed_frame = self.draw_detection_overlay(processed_frame, total_detections)
-                    
-                    last_processed_frame = processed_frame
-                
-                # If we detected a palm, we can return early
-                if palm_detected_overall and last_processed_frame is not None:
-                    break
-                
-                await asyncio.sleep(0.03)  # ~30 FPS
-            
-            # Prepare response
-            if last_processed_frame is not None:
-                frame_base64 = self.frame_to_base64(last_processed_frame)
-            else:
-                frame_base64 = None
-            
-            message = ""
-            if palm_detected_overall:
-                message = f"🚨 PALM DETECTED! Found {total_detections} open palm(s) in the video stream."
-            else:
-                message = f"No palm detected during {timeout} second monitoring period."
-            
-            return {
-                "success": True,
-                "palm_detected": palm_detected_overall,
-                "message": message,
-                "detection_count": total_detections,
-                "processed_frame": frame_base64,
-                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-        except Exception as e:
+        if not connected:
             return {
                 "success": False,
                 "palm_detected": False,
-                "message": f"Error processing video stream: {str(e)}",
+                "message": f"Failed to connect to IP camera: {ip_address}",
                 "detection_count": 0,
                 "processed_frame": None,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
             }
         
+        start_time = time.time()
+        frame_count = 0
+        frames_inferred = 0
+        total_detections = 0
+        palm_detected_overall = False
+        frame_base64 = None
+        snapshot = None
+        
+        while time.time() - start_time < timeout:
+            with timed(stage_seconds, 'camera_read'):
+                frame = await video_stream.read_async(0.5)
+            if frame is None:
+                continue
+            
+            frame_count += 1
+            frames_total.inc(outcome='read')
+            
+            # Skip static frames / stay within the FPS budget unless a hand is being tracked
+            with timed(stage_seconds, 'sampling'):
+                infer = sampler.should_infer(frame, time.monotonic())
+            if not infer:
+                continue
+            
+            still_valid = video_stream.validator()
+            try:
+                async with checkout(max(0.0, start_time + timeout - time.time())) as detector:
+                    with timed(stage_seconds, 'detect'):
+                        if shared:
+                            result, frame_snapshot = await frame_processor.run(
+                                detector.detect_and_snapshot, frame, still_valid, drop_if_busy=True
+                            ) or (None, None)
+                        else:
+                            result = await frame_processor.run(detector.detect, frame, still_valid, drop_if_busy=True)
+                    if result is not None and result['palm_detected'] and shared:
+                        # The next checkout may go to another camera: render while this one holds the detector
+                        with timed(stage_seconds, 'render'):
+                            frame_base64 = await frame_processor.run(detector.render_jpeg, result['detection_count'])
+            except TimeoutError:
+                break  # no shared detector freed up before the deadline
+            
+            if result is None:
+                # Pool saturated (or frame overwritten): skip it rather than queue behind other cameras
+                frames_total.inc(outcome='skipped')
+                continue
+            frames_inferred += 1
+            frames_total.inc(outcome='inferred')
+            sampler.observe(result['hand_count'], time.monotonic())
+            if shared:
+                snapshot = frame_snapshot
+            
+            # If we detected a palm, we can return early
+            if result['palm_detected']:
+                palm_detected_overall = True
+                total_detections += result['detection_count']
+                break
+        
+        # Prepare response: only the frame being returned is annotated and encoded
+        if not shared and frames_inferred:
+            async with checkout() as detector:
+                with timed(stage_seconds, 'render'):
+                    frame_base64 = await frame_processor.run(detector.render_jpeg, total_detections)
+        elif shared and snapshot is not None and frame_base64 is None:
+            try:
+                async with checkout(CONNECT_TIMEOUT) as detector:
+                    with timed(stage_seconds, 'render'):
+                        frame_base64 = await frame_processor.run(detector.detect_and_render, snapshot)
+            except TimeoutError:
+                pass  # report the result without a frame
+        
+        message = ""
+        if palm_detected_overall:
+            message = f"🚨 PALM DETECTED! Found {total_detections} open palm(s) in the video stream."
+        else:
+            message = f"No palm detected during {timeout:g} second monitoring period."
+        
+        return {
+            "success": True,
+            "palm_detected": palm_detected_overall,
+            "message": message,
+            "detection_count": total_detections,
+            "processed_frame": frame_base64,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "frames_read": frame_count,
+            "frames_inferred": frames_inferred
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "palm_detected": False,
+            "message": f"Error processing video stream: {str(e)}",
+            "detection_count": 0,
+            "processed_frame": None,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    finally:
+        if video_stream:
+            video_stream.close()
+
+class DetectorPool:
+    """Warm PalmDetectionAPI instances per sensitivity bucket
+
+    Hands.process keeps tracking state, so a detector is checked out to one
+    request at a time. Buckets grow on demand up to max_per_bucket; further
+    requests wait on an asyncio semaphore (not a thread) for a release. A
+    detector goes back to the camera it last watched when possible, and
+    has its tracker reset before it is handed to another camera.
+    Only used from the event loop.
+    """
+    
+    def __init__(self, max_per_bucket=4, step=0.05, static_image_mode=False):
+        self.max_per_bucket = max_per_bucket
+        self.step = step
+        self.static_image_mode = static_image_mode
+        self.buckets = {}  # confidence -> {'slots': Semaphore, 'idle': [detector], 'size': int}
+    
+    def bucket(self, confidence):
+        confidence = 0.7 if confidence is None else min(max(float(confidence), 0.0), 1.0)
+        return round(round(confidence / self.step) * self.step, 4)
+    
+    async def acquire(self, confidence, camera=None, timeout=None):
+        key = self.bucket(confidence)
+        bucket = self.buckets.setdefault(
+            key, {'slots': asyncio.Semaphore(self.max_per_bucket), 'idle': [], 'size': 0})
+        try:
+            await asyncio.wait_for(bucket['slots'].acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No palm detector available for sensitivity {key}")
+        
+        try:
+            idle = bucket['idle']
+            if not idle:
+                bucket['size'] += 1
+                try:
+                    return await asyncio.to_thread(PalmDetectionAPI, key, self.static_image_mode)
+                except BaseException:
+                    bucket['size'] -= 1
+                    raise
+            # Prefer the detector that last watched this camera; otherwise the most recently used one
+            index = next((i for i in range(len(idle) - 1, -1, -1) if idle[i].camera == camera), len(idle) - 1)
+            detector = idle.pop(index)
+            if detector.camera != camera:
+                await asyncio.to_thread(detector.reset_tracking)
+            return detector
+        except BaseException:
+            bucket['slots'].release()
+            raise
+    
+    def release(self, detector, camera=None):
+        detector.camera = camera
+        bucket = self.buckets[detector.detection_confidence]
+        bucket['idle'].append(detector)
+        bucket['slots'].release()
+    
+    @contextlib.asynccontextmanager
+    async def checkout(self, confidence, camera=None, timeout=None):
+        detector = await self.acquire(confidence, camera, timeout)
+        try:
+            yield detector
         finally:
-            if video_stream:
-                video_stream.stop()
+            self.release(detector, camera)
+    
+    async def prewarm(self, confidence, count=1, frame_size=None):
+        detectors = [await self.acquire(confidence) for _ in range(min(count, self.max_per_bucket))]
+        for detector in detectors:
+            if frame_size:
+                await asyncio.to_thread(detector.warm_up, frame_size)
+            self.release(detector)
+    
+    def stats(self):
+        return {
+            str(key): {'size': bucket['size'], 'idle': len(bucket['idle'])}
+            for key, bucket in self.buckets.items()
+        }
+
+# Global detector pools
+detector_pool = DetectorPool(max_per_bucket=DETECTORS_PER_BUCKET, step=SENSITIVITY_STEP)
+alert_detector_pool = DetectorPool(max_per_bucket=MAX_ALERT_STREAMS, step=SENSITIVITY_STEP)
+sweep_detector_pool = DetectorPool(max_per_bucket=SWEEP_DETECTORS_PER_BUCKET, step=SENSITIVITY_STEP,
+                                   static_image_mode=True)
+
+def stream_total(name):
+    return lambda: stream_registry.totals()[name]
+
+metrics_registry.callback('streams_open', 'Camera streams currently open', lambda: len(stream_registry.stats()))
+metrics_registry.callback('stream_frames_read_total', 'Frames decoded by shared camera readers',
+                          stream_total('frames_read'), type='counter')
+metrics_registry.callback('stream_frames_dropped_total', 'Frames replaced by a newer one before any subscriber read them',
+                          stream_total('frames_dropped'), type='counter')
+metrics_registry.callback('stream_reconnects_total', 'Camera reconnects', stream_total('reconnects'), type='counter')
+metrics_registry.callback('detectors', 'MediaPipe detectors per sensitivity bucket', labelnames=('sensitivity', 'state'),
+                          fn=lambda: {(key, state): bucket[state] for key, bucket in detector_pool.stats().items()
+                                      for state in ('size', 'idle')})
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    timings = StageTimings()
+    token = timings.activate()
+    try:
+        response = await call_next(request)
+    finally:
+        current_timings.reset(token)
+    # Route template, not the raw path; unknown paths share one series
+    route = request.scope.get('route')
+    endpoint = route.path if route is not None else 'unmatched'
+    request_seconds.observe(time.perf_counter() - timings.started, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=response.status_code)
+    if response.status_code >= 400:
+        request_errors_total.inc(endpoint=endpoint, status=response.status_code)
+    if SERVER_TIMING and (request.headers.get('x-server-timing') == '1'
+                          or request.query_params.get('server_timing') == '1'):
+        response.headers['Server-Timing'] = timings.header()
+    return response
 
-# Global detector instance
-detector = PalmDetectionAPI()
 
 @app.post("/detect-palm", response_model=PalmDetectionResponse)
 async def detect_palm(request: PalmDetectionRequest):
@@ -309,27 +633,307 @@ async def detect_palm(request: PalmDetectionRequest):
     - **ip_address**: IP camera URL (e.g., 'http://192.168.0.111:4747/video')
     - **timeout**: Maximum time to monitor in seconds (default: 10)
     - **detection_sensitivity**: Detection confidence threshold (default: 0.7)
+    - **sampling**: 'adaptive' (motion-gated, bursts while a hand is tracked) or 'every_nth'
+    - **target_fps**: Maximum inferences per second for adaptive sampling (default: 10)
     """
     
     if not request.ip_address:
         raise HTTPException(status_code=400, detail="IP address is required")
+    if (request.sampling or "adaptive") not in SAMPLERS:
+        raise HTTPException(status_code=400, detail=f"sampling must be one of: {', '.join(SAMPLERS)}")
     
-    # Update detection sensitivity
-    global detector
-    detector = PalmDetectionAPI(detection_confidence=request.detection_sensitivity)
+    if detection_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many concurrent palm detections, try again later")
     
-    # Process the request
-    result = await detector.detect_palm_from_ip(
-        ip_address=request.ip_address,
-        timeout=request.timeout
-    )
+    async with detection_slots:
+        # Check out a warm detector for this sensitivity
+        try:
+            detector = await detector_pool.acquire(
+                request.detection_sensitivity, request.ip_address, DETECTOR_ACQUIRE_TIMEOUT
+            )
+        except TimeoutError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        
+        try:
+            # Process the request
+            result = await detector.detect_palm_from_ip(
+                ip_address=request.ip_address,
+                timeout=request.timeout,
+                sampling=request.sampling or "adaptive",
+                target_fps=request.target_fps
+            )
+        finally:
+            detector_pool.release(detector, request.ip_address)
     
     return PalmDetectionResponse(**result)
 
+async def detect_camera(ip_address, deadline, request):
+    """One camera of a batch sweep, monitored until the shared deadline with per-frame sweep detectors"""
+    remaining = max(0.0, deadline - time.monotonic())
+    result = await monitor_camera(
+        ip_address,
+        lambda timeout=None: sweep_detector_pool.checkout(request.detection_sensitivity, timeout=timeout),
+        timeout=remaining,
+        sampling=request.sampling or "adaptive",
+        target_fps=request.target_fps,
+        connect_timeout=min(CONNECT_TIMEOUT, remaining),
+        shared=True
+    )
+    return CameraDetectionResult(ip_address=ip_address, **result)
+
+@app.post("/detect-palm/batch", response_model=BatchPalmDetectionResponse)
+async def detect_palm_batch(request: BatchPalmDetectionRequest):
+    """
+    Sweep several IP cameras concurrently under one shared deadline
+    
+    - **ip_addresses**: IP camera URLs (duplicates are checked once)
+    - **timeout**: Deadline for the whole sweep in seconds (default: 10)
+    - **stream**: Return NDJSON lines, one per camera as it completes, instead of one JSON body
+    """
+    cameras = list(dict.fromkeys(ip for ip in request.ip_addresses if ip))
+    if not cameras:
+        raise HTTPException(status_code=400, detail="At least one IP address is required")
+    if len(cameras) > MAX_BATCH_CAMERAS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_CAMERAS} cameras per batch")
+    if (request.sampling or "adaptive") not in SAMPLERS:
+        raise HTTPException(status_code=400, detail=f"sampling must be one of: {', '.join(SAMPLERS)}")
+    if detection_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many concurrent palm detections, try again later")
+    
+    started = time.monotonic()
+    deadline = started + (request.timeout or 10)
+    
+    async def sweep():
+        async with detection_slots:
+            tasks = [asyncio.create_task(detect_camera(ip, deadline, request)) for ip in cameras]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+    
+    if request.stream:
+        async def ndjson():
+            async for result in sweep():
+                yield result.json() + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    
+    completed = {result.ip_address: result async for result in sweep()}
+    results = [completed[ip] for ip in cameras]
+    with_palm = [result.ip_address for result in results if result.palm_detected]
+    return BatchPalmDetectionResponse(
+        success=all(result.success for result in results),
+        camera_count=len(results),
+        palm_detected=bool(with_palm),
+        cameras_with_palm=with_palm,
+        elapsed_seconds=round(time.monotonic() - started, 3),
+        results=results,
+        timestamp=time.strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+async def palm_events(ip_address, detector, sampling="adaptive", target_fps=None, frame_interval=0.0):
+    """Continuous detection events for one camera subscription, using a detector leased by the caller
+
+    Yields a 'status' event once connected, a 'detection' event for every
+    inferred frame with open palms (with bounding boxes), a 'clear' event when
+    palms disappear and a 'heartbeat' every ALERT_HEARTBEAT_SECONDS. When
+    frame_interval > 0, detection events carry an annotated JPEG at most
+    once per frame_interval seconds.
+    """
+    sampler = create_sampler(sampling, target_fps)
+    subscription = stream_registry.subscribe(ip_address)
+    
+    try:
+        connected = await subscription.wait_connected_async(CONNECT_TIMEOUT)
+        yield {"type": "status", "connected": connected, "ip_address": ip_address, "timestamp": time.time()}
+        if not connected:
+            return
+        
+        frames_read = 0
+        frames_inferred = 0
+        last_palm_count = 0
+        last_frame_sent = float('-inf')
+        last_heartbeat = time.monotonic()
+        
+        while True:
+            frame = await subscription.read_async(1.0)
+            now = time.monotonic()
+            
+            if frame is not None:
+                frames_read += 1
+                frames_total.inc(outcome='read')
+                if sampler.should_infer(frame, now):
+                    with timed(stage_seconds, 'detect'):
+                        result = await frame_processor.run(
+                            detector.detect, frame, subscription.validator(), drop_if_busy=True
+                        )
+                    if result is None:
+                        frames_total.inc(outcome='skipped')
+                    else:
+                        frames_inferred += 1
+                        frames_total.inc(outcome='inferred')
+                        sampler.observe(result['hand_count'], now)
+                        palm_count = result['detection_count']
+                        
+                        if palm_count:
+                            event = {
+                                "type": "detection",
+                                "palm_count": palm_count,
+                                "boxes": result['palm_boxes'],
+                                "frame_size": [frame.shape[1], frame.shape[0]],
+                                "timestamp": time.time()
+                            }
+                            if frame_interval and now - last_frame_sent >= frame_interval:
+                                with timed(stage_seconds, 'render'):
+                                    event["frame"] = await frame_processor.run(detector.render_jpeg, palm_count)
+                                last_frame_sent = now
+                            yield event
+                        elif last_palm_count:
+                            yield {"type": "clear", "palm_count": 0, "timestamp": time.time()}
+                        last_palm_count = palm_count
+            
+            if now - last_heartbeat >= ALERT_HEARTBEAT_SECONDS:
+                last_heartbeat = now
+                yield {
+                    "type": "heartbeat",
+                    "connected": subscription.connected,
+                    "frames_read": frames_read,
+                    "frames_inferred": frames_inferred,
+                    "timestamp": time.time()
+                }
+    finally:
+        subscription.close()
+
+alert_stream_slots = asyncio.Semaphore(MAX_ALERT_STREAMS)
+
+async def lease_alert_detector(ip_address, sensitivity):
+    """Alert stream slot and detector, or None when at capacity; returns (detector, release)
+
+    Taken before the response starts, so a full server answers with a 503 or
+    a 1013 close instead of a stream that ends at once. Awaiting release() more
+    than once is harmless.
+    """
+    if alert_stream_slots.locked():
+        return None
+    await alert_stream_slots.acquire()
+    try:
+        detector = await alert_detector_pool.acquire(sensitivity, ip_address, DETECTOR_ACQUIRE_TIMEOUT)
+    except BaseException as e:
+        alert_stream_slots.release()
+        if isinstance(e, TimeoutError):
+            return None
+        raise
+    
+    released = False
+    async def release():
+        nonlocal released
+        if not released:
+            released = True
+            alert_detector_pool.release(detector, ip_address)
+            alert_stream_slots.release()
+    return detector, release
+
+@app.websocket("/ws/palm-alerts")
+async def palm_alerts_websocket(websocket: WebSocket, ip_address: str, detection_sensitivity: float = 0.7,
+                                sampling: str = "adaptive", target_fps: Optional[float] = None,
+                                frame_interval: float = 0.0):
+    """
+    Continuous palm alerts over a WebSocket (JSON messages)
+    
+    - **ip_address**: IP camera URL
+    - **frame_interval**: Seconds between annotated JPEGs attached to detection events (0: never)
+    """
+    if sampling not in SAMPLERS:
+        await websocket.close(code=1008)
+        return
+    lease = await lease_alert_detector(ip_address, detection_sensitivity)
+    if lease is None:
+        await websocket.close(code=1013)  # try again later
+        return
+    detector, release = lease
+    
+    try:
+        await websocket.accept()
+        events = palm_events(ip_address, detector, sampling, target_fps, frame_interval)
+        try:
+            async for event in events:
+                await websocket.send_json(event)
+        except (WebSocketDisconnect, ConnectionError, RuntimeError):
+            pass  # client went away
+        finally:
+            await events.aclose()
+    finally:
+        await release()
+    
+    try:
+        await websocket.close()
+    except RuntimeError:
+        pass  # already closed by the client
+
+@app.get("/palm-alerts/stream")
+async def palm_alerts_sse(ip_address: str, detection_sensitivity: float = 0.7, sampling: str = "adaptive",
+                          target_fps: Optional[float] = None, frame_interval: float = 0.0):
+    """Continuous palm alerts as Server-Sent Events (same events as /ws/palm-alerts)"""
+    if sampling not in SAMPLERS:
+        raise HTTPException(status_code=400, detail=f"sampling must be one of: {', '.join(SAMPLERS)}")
+    lease = await lease_alert_detector(ip_address, detection_sensitivity)
+    if lease is None:
+        raise HTTPException(status_code=503, detail="Too many open alert streams, try again later")
+    detector, release = lease
+    
+    async def event_source():
+        events = palm_events(ip_address, detector, sampling, target_fps, frame_interval)
+        try:
+            async for event in events:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            await events.aclose()
+            await release()
+    
+    # The background task releases the lease if the client leaves before the stream starts
+    return StreamingResponse(event_source(), media_type="text/event-stream", background=BackgroundTask(release),
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "message": "Palm Detection API is running"}
+    return {
+        "status": "healthy",
+        "message": "Palm Detection API is running",
+        "streams": stream_registry.stats(),
+        "detectors": detector_pool.stats(),
+        "alert_detectors": alert_detector_pool.stats(),
+        "sweep_detectors": sweep_detector_pool.stats(),
+        "frame_pool": frame_processor.stats(),
+        "startup": startup
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the detectors are prewarmed (/health is liveness only)"""
+    return JSONResponse(startup, status_code=200 if startup['ready'] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage/request latency histograms, frame counters, pool and stream gauges"""
+    return Response(metrics_registry.render(), media_type=CONTENT_TYPE)
+
+@app.on_event("startup")
+async def prewarm_detectors():
+    started = time.perf_counter()
+    for sensitivity in PREWARM_SENSITIVITIES:
+        await detector_pool.prewarm(sensitivity, DETECTORS_PER_BUCKET, WARMUP_FRAME_SIZE)
+    startup['warmup_seconds'] = round(time.perf_counter() - started, 3)
+    startup['startup_seconds'] = round(time.perf_counter() - PROCESS_STARTED, 3)
+    startup['ready'] = True
+    print(f"🔥 Palm detectors warmed up in {startup['warmup_seconds']:.2f}s, "
+          f"ready {startup['startup_seconds']:.2f}s after start")
+
+@app.on_event("shutdown")
+def close_streams():
+    stream_registry.close_all()
+    frame_processor.shutdown()
 
 @app.get("/")
 async def root():
@@ -339,7 +943,12 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "detect-palm": "POST /detect-palm - Detect palm from IP camera",
-            "health": "GET /health - Health check",
+            "detect-palm-batch": "POST /detect-palm/batch - Sweep many IP cameras concurrently",
+            "palm-alerts-ws": "WS /ws/palm-alerts?ip_address=... - Continuous palm alerts (WebSocket)",
+            "palm-alerts-sse": "GET /palm-alerts/stream?ip_address=... - Continuous palm alerts (SSE)",
+            "health": "GET /health - Health check (liveness)",
+            "ready": "GET /ready - Readiness (detectors warmed up)",
+            "metrics": "GET /metrics - Prometheus metrics",
             "docs": "GET /docs - API documentation"
         }
     }
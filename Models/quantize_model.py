@@ -0,0 +1,111 @@
+"""Calibrate a static int8 MC_CNN and compare optimized inference modes
+
+    python quantize_model.py --calibration-dir samples/ --out exported/best_crowd_counting_model_int8.pt
+
+The int8 model is calibrated on the images in --calibration-dir and saved as
+TorchScript (load it with load_model / serve_density.py --model). Every
+available mode -- fp32, channels_last, bf16 and int8 -- is then run over the
+evaluation images and its count error against the fp32 baseline, latency
+and weight footprint are reported.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+from density import ALLOWED_EXTENSIONS, build_mc_cnn, preprocess_image, read_image_file
+from model_backends import (EagerBackend, TorchScriptBackend, bf16_supported, export_torchscript,
+                            quantize_static_int8)
+
+
+def load_images(folder, limit):
+    """Preprocessed tensors for up to `limit` images in a folder"""
+    names = sorted(name for name in os.listdir(folder) if name.rsplit('.', 1)[-1].lower() in ALLOWED_EXTENSIONS)
+    tensors = []
+    for name in names[:limit]:
+        img_tensor, _ = preprocess_image(read_image_file(os.path.join(folder, name)), reuse_buffers=False)
+        tensors.append(img_tensor)
+    if not tensors:
+        raise SystemExit(f"❌ No images found in {folder}")
+    return tensors
+
+
+def evaluate(backend, tensors, baseline=None):
+    """Counts, mean latency and error against the baseline counts"""
+    backend(tensors[0])  # warm up
+    counts, latencies = [], []
+    for tensor in tensors:
+        start = time.perf_counter()
+        counts.append(float(backend(tensor).sum()))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    result = {'counts': counts, 'mean_latency_ms': round(float(np.mean(latencies)), 2)}
+    if baseline is not None:
+        errors = np.abs(np.array(counts) - np.array(baseline))
+        result['mean_abs_count_error'] = round(float(errors.mean()), 3)
+        result['max_abs_count_error'] = round(float(errors.max()), 3)
+        result['mean_rel_count_error'] = round(float((errors / np.maximum(np.abs(baseline), 1e-6)).mean()), 5)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Static int8 calibration and inference mode comparison')
+    parser.add_argument('--checkpoint', default='best_crowd_counting_model.pth')
+    parser.add_argument('--calibration-dir', required=True, help='folder of sample crowd images')
+    parser.add_argument('--eval-dir', default=None, help='images for the error report (default: calibration dir)')
+    parser.add_argument('--max-images', type=int, default=32)
+    parser.add_argument('--out', default=None, help='int8 TorchScript output path')
+    parser.add_argument('--engine', default='x86', help="quantized engine ('x86', 'fbgemm' or 'qnnpack')")
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    name = os.path.splitext(os.path.basename(args.checkpoint))[0]
+    out = args.out or os.path.join('exported', f'{name}_int8.pt')
+    os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+
+    net = build_mc_cnn(args.checkpoint).cpu()
+    calibration = load_images(args.calibration_dir, args.max_images)
+    evaluation = load_images(args.eval_dir, args.max_images) if args.eval_dir else calibration
+
+    print(f"🎛️ Calibrating int8 model on {len(calibration)} image(s)...")
+    quantized = quantize_static_int8(net, calibration, calibration[0], engine=args.engine)
+    export_torchscript(quantized, out, calibration[0], optimize=False)
+    print(f"📦 int8 TorchScript -> {out}")
+
+    modes = {
+        'fp32': lambda: EagerBackend(build_mc_cnn(args.checkpoint), 'cpu', 'fp32'),
+        'channels_last': lambda: EagerBackend(build_mc_cnn(args.checkpoint), 'cpu', 'channels_last'),
+        'bf16': lambda: EagerBackend(build_mc_cnn(args.checkpoint), 'cpu', 'bf16'),
+        'int8': lambda: TorchScriptBackend(out, 'cpu')
+    }
+    if not bf16_supported():
+        print("⚠️ Skipping bf16: no native bfloat16 support on this CPU")
+        del modes['bf16']
+
+    report = {}
+    baseline = None
+    for mode, build in modes.items():
+        report[mode] = evaluate(build(), evaluation, baseline)
+        if mode == 'fp32':
+            baseline = report[mode]['counts']
+    report['int8']['weights_mb'] = round(os.path.getsize(out) / 1024 / 1024, 2)
+    report['fp32']['weights_mb'] = round(os.path.getsize(args.checkpoint) / 1024 / 1024, 2)
+
+    if args.json:
+        print(json.dumps({mode: {k: v for k, v in r.items() if k != 'counts'} for mode, r in report.items()}, indent=2))
+        return 0
+
+    print(f"\n{'mode':>14} | {'latency ms':>10} | {'speedup':>7} | {'mean abs err':>12} | {'mean rel err':>12}")
+    for mode, r in report.items():
+        speedup = report['fp32']['mean_latency_ms'] / max(r['mean_latency_ms'], 1e-9)
+        print(f"{mode:>14} | {r['mean_latency_ms']:>10.2f} | {speedup:>6.2f}x | "
+              f"{r.get('mean_abs_count_error', 0.0):>12.3f} | {r.get('mean_rel_count_error', 0.0):>12.5f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by total bytes, with a TTL and optional disk spill
+
+    Values must expose an `nbytes` attribute. When `spill_dir` is set,
+    entries evicted for space are pickled there and promoted back into
+    memory on their next hit; the spill directory is pruned oldest-first
+    beyond `max_spill_bytes`.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, ttl_seconds=300, spill_dir=None,
+                 max_spill_bytes=2 * 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        self.entries = OrderedDict()  # key -> (value, nbytes, expires_at)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.spill_hits = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None:
+                value, nbytes, expires_at = item
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+                self.total_bytes -= nbytes
+
+        value, expires_at = self._load_spilled(key, now)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.spill_hits += 1
+        self.put(key, value, expires_at)
+        return value
+
+    def put(self, key, value, expires_at=None):
+        """Insert or re-account a value (call again after the value grows)"""
+        nbytes = int(value.nbytes)
+        if nbytes > self.max_bytes:
+            return
+        spilled = []
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+                expires_at = expires_at or old[2]
+            else:
+                expires_at = expires_at or time.time() + self.ttl
+            self.entries[key] = (value, nbytes, expires_at)
+            self.total_bytes += nbytes
+
+            while self.total_bytes > self.max_bytes:
+                evicted_key, (evicted, evicted_bytes, evicted_expiry) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_bytes
+                self.evictions += 1
+                spilled.append((evicted_key, evicted, evicted_expiry))
+
+        if self.spill_dir:
+            for evicted_key, evicted, evicted_expiry in spilled:
+                self._spill(evicted_key, evicted, evicted_expiry)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'spill_hits': self.spill_hits,
+                'evictions': self.evictions,
+                'ttl_seconds': self.ttl
+            }
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f'{key}.pkl')
+
+    def _spill(self, key, value, expires_at):
+        if expires_at <= time.time():
+            return
+        path = self._spill_path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._prune_spill()
+
+    def _load_spilled(self, key, now):
+        if not self.spill_dir:
+            return None, None
+        path = self._spill_path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+            os.remove(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None, None
+        if expires_at <= now:
+            return None, None
+        return value, expires_at
+
+    def _prune_spill(self):
+        try:
+            files = [os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir)
+                     if name.endswith('.pkl')]
+            files = sorted((os.stat(path).st_mtime, os.path.getsize(path), path) for path in files)
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_spill_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
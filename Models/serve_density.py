@@ -0,0 +1,184 @@
+"""Multi-process serving mode for the crowd counting API
+
+Binds one listening socket, then spawns N worker processes that each load
+MC_CNN once, pin themselves to their own block of CPU cores, limit torch to
+their share of intra-op threads and accept connections from the shared
+socket through waitress, a production WSGI server. The parent only
+supervises and restarts workers that die.
+
+    python serve_density.py --workers 8 --threads-per-worker 4
+"""
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import socket
+import sys
+import time
+
+DEFAULT_MODEL_PATH = 'best_crowd_counting_model.pth'
+MODEL_LOAD_FAILED = 3
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cpu_sets(workers, threads, cpus):
+    """Split the available cores into one contiguous block per worker"""
+    if len(cpus) < workers * threads:
+        return [None] * workers
+    return [cpus[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def worker_main(sock, worker_id, args, cpu_set):
+    """Entry point of one serving process"""
+    # The supervisor handles Ctrl-C and terminates workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cpu_set and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_set)
+
+    import torch
+    torch.set_num_threads(args.threads_per_worker)
+    torch.set_num_interop_threads(1)
+
+    import density
+    from waitress import create_server
+
+    density.BATCH_CONFIG['max_batch_size'] = args.max_batch_size
+    density.BATCH_CONFIG['max_latency_ms'] = args.max_latency_ms
+    density.BATCH_CONFIG['enabled'] = args.max_batch_size > 1
+    density.WARMUP_CONFIG['iterations'] = args.warmup_iterations
+    density.JOB_CONFIG['store'] = args.job_store
+    # Sessions are per process and the shared socket cannot route a camera to one worker
+    density.SESSION_CONFIG['enabled'] = args.workers == 1
+    if args.job_db:
+        density.JOB_CONFIG['sqlite_path'] = args.job_db
+    if not density.load_model(args.model, args.backend, args.precision):
+        sys.exit(MODEL_LOAD_FAILED)
+
+    # Bodies up to MAX_CONTENT_LENGTH stay in memory (waitress spools larger request bodies to a temp file)
+    max_body = density.app.config['MAX_CONTENT_LENGTH'] + 64 * 1024
+    server = create_server(density.app, sockets=[sock], threads=args.http_threads,
+                           inbuf_overflow=max_body, max_request_body_size=max_body,
+                           ident='crowd-counting')
+    cpus = ','.join(map(str, cpu_set)) if cpu_set else 'any'
+    print(f"👷 Worker {worker_id} (pid {os.getpid()}) ready in {density.startup['startup_seconds']:.2f}s: "
+          f"{args.threads_per_worker} torch threads, {args.http_threads} request threads, cpus {cpus}")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    server.run()
+
+
+def parse_args(argv=None):
+    cpus = available_cpus()
+    parser = argparse.ArgumentParser(description='Multi-process crowd counting API server')
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH,
+                        help='MC_CNN state dict (.pth), TorchScript (.pt) or ONNX (.onnx) file')
+    parser.add_argument('--backend', choices=('eager', 'torchscript', 'onnx'), default=None,
+                        help='inference backend (default: from the model file extension)')
+    parser.add_argument('--precision', choices=('fp32', 'channels_last', 'bf16'), default='fp32',
+                        help='eager backend execution mode (int8: pass the quantize_model.py output as --model)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='torch intra-op threads per worker (default: 2, or all cores with --workers 1)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default: cores / threads-per-worker)')
+    parser.add_argument('--no-affinity', action='store_true', help='do not pin workers to CPU cores')
+    parser.add_argument('--max-batch-size', type=int, default=8, help='micro-batch size per worker (1 disables)')
+    parser.add_argument('--max-latency-ms', type=float, default=10, help='micro-batch wait window per worker')
+    parser.add_argument('--backlog', type=int, default=512, help='listen backlog of the shared socket')
+    parser.add_argument('--http-threads', type=int, default=8,
+                        help='waitress request threads per worker (requests wait on the micro-batcher, not the CPU)')
+    parser.add_argument('--job-store', choices=('memory', 'sqlite'), default=None,
+                        help='/jobs queue store (default: sqlite with several workers, so any worker can '
+                             'answer for any job; memory with one)')
+    parser.add_argument('--job-db', default=None, help='sqlite job store path (default: density.JOB_CONFIG)')
+    parser.add_argument('--warmup-iterations', type=int, default=2,
+                        help='forward passes per batch size before a worker accepts requests (0 skips warm-up)')
+    args = parser.parse_args(argv)
+
+    if args.threads_per_worker is None:
+        args.threads_per_worker = len(cpus) if args.workers == 1 else min(2, len(cpus))
+    if args.workers is None:
+        args.workers = max(1, len(cpus) // args.threads_per_worker)
+    if args.workers < 1 or args.threads_per_worker < 1:
+        parser.error('--workers and --threads-per-worker must be at least 1')
+    if args.job_store is None:
+        args.job_store = 'sqlite' if args.workers > 1 else 'memory'
+    elif args.job_store == 'memory' and args.workers > 1:
+        print("⚠️ --job-store memory with several workers: job status is only visible to the worker that queued it")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(args.model):
+        print(f"❌ Model file not found: {args.model}")
+        return 1
+
+    # Keep OpenMP/MKL in each child from sizing its pool to the whole machine
+    os.environ['OMP_NUM_THREADS'] = str(args.threads_per_worker)
+    os.environ['MKL_NUM_THREADS'] = str(args.threads_per_worker)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    sock.set_inheritable(True)
+
+    cpu_sets = [None] * args.workers
+    if not args.no_affinity:
+        cpu_sets = plan_cpu_sets(args.workers, args.threads_per_worker, available_cpus())
+
+    ctx = mp.get_context('spawn')
+    workers = {}
+    stopping = False
+    exit_code = 0
+
+    def spawn(worker_id):
+        process = ctx.Process(target=worker_main, args=(sock, worker_id, args, cpu_sets[worker_id]),
+                              name=f'density-worker-{worker_id}', daemon=True)
+        process.start()
+        workers[worker_id] = process
+
+    def shutdown(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    print(f"🚀 Starting {args.workers} worker(s) x {args.threads_per_worker} thread(s) "
+          f"on http://{args.host}:{args.port}")
+    for worker_id in range(args.workers):
+        spawn(worker_id)
+
+    try:
+        while not stopping:
+            time.sleep(1.0)
+            for worker_id, process in list(workers.items()):
+                if process.is_alive() or stopping:
+                    continue
+                if process.exitcode == MODEL_LOAD_FAILED:
+                    print(f"❌ Worker {worker_id} could not load the model, shutting down")
+                    stopping = True
+                    exit_code = 1
+                else:
+                    print(f"⚠️ Worker {worker_id} exited with code {process.exitcode}, restarting")
+                    spawn(worker_id)
+    finally:
+        for process in workers.values():
+            if process.is_alive():
+                process.terminate()
+        for process in workers.values():
+            process.join(timeout=10)
+        sock.close()
+        print("🛑 All workers stopped")
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import numpy as np
+
+
+def fit_to_pixel_budget(width, height, max_pixels, stride=4):
+    """Largest stride-aligned size with the input's aspect ratio and at most max_pixels"""
+    scale = min(1.0, (max_pixels / float(width * height)) ** 0.5)
+    width = max(stride, int(width * scale) // stride * stride)
+    height = max(stride, int(height * scale) // stride * stride)
+    return width, height
+
+
+def tile_origins(length, tile, overlap, stride=4):
+    """Stride-aligned start offsets covering [0, length) with tiles of `tile` overlapping by `overlap`"""
+    if length <= tile:
+        return [0]
+    step = max(stride, (tile - overlap) // stride * stride)
+    origins = list(range(0, length - tile, step))
+    origins.append(length - tile)
+    return origins
+
+
+def plan_tiles(width, height, tile_size, overlap, stride=4):
+    """(x, y, w, h) tiles, all of the same size so they can be stacked into one batch"""
+    tile_w = min(tile_size[0], width) // stride * stride
+    tile_h = min(tile_size[1], height) // stride * stride
+    return [(x, y, tile_w, tile_h)
+            for y in tile_origins(height, tile_h, overlap, stride)
+            for x in tile_origins(width, tile_w, overlap, stride)]
+
+
+def blend_window(height, width, ramp):
+    """Tent weights that fall off towards tile edges over `ramp` density pixels"""
+    def axis(n):
+        if ramp <= 0:
+            return np.ones(n, dtype=np.float32)
+        idx = np.arange(n, dtype=np.float32)
+        return np.clip(np.minimum(idx + 1, n - idx) / float(ramp), 1e-3, 1.0)
+    return np.outer(axis(height), axis(width))
+
+
+def stitch_density_maps(density_tiles, tiles, width, height, overlap, downsample=4):
+    """Blend per-tile density maps back into one map of the full image
+
+    Overlapping predictions are averaged with tent weights, so every output
+    pixel is a convex combination of the tiles covering it and the stitched
+    map still integrates to the crowd count.
+    """
+    out_h, out_w = height // downsample, width // downsample
+    accumulated = np.zeros((out_h, out_w), dtype=np.float32)
+    weights = np.zeros((out_h, out_w), dtype=np.float32)
+    window = None
+
+    for density, (x, y, _, _) in zip(density_tiles, tiles):
+        th, tw = density.shape
+        if window is None or window.shape != (th, tw):
+            window = blend_window(th, tw, overlap // downsample)
+        dy, dx = y // downsample, x // downsample
+        accumulated[dy:dy + th, dx:dx + tw] += density * window
+        weights[dy:dy + th, dx:dx + tw] += window
+
+    np.divide(accumulated, weights, out=accumulated, where=weights > 0)
+    return accumulated
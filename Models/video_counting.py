@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+
+import cv2
+
+
+class FrameReader:
+    """Background decoder for a video file or stream URL that yields sampled RGB frames
+
+    Frames are sampled at `sample_fps` on the source timeline (every frame
+    when None). Skipped frames are only grabbed, never retrieved, so they
+    are not colour-converted or copied. Sampled frames wait in a bounded
+    queue: for files decoding blocks when inference falls behind, for live
+    streams the newest frame replaces the oldest queued one instead.
+    """
+    END = object()
+
+    def __init__(self, src, sample_fps=None, max_frames=None, max_seconds=None, queue_size=16, live=None):
+        self.src = src
+        self.sample_interval = 1.0 / sample_fps if sample_fps else 0.0
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        self.live = ('://' in src) if live is None else live
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self.source_fps = None
+        self.frames_decoded = 0
+        self.frames_sampled = 0
+        self.frames_dropped = 0
+        self.error = None
+        self.finished = False
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.update, name=f'frame-reader:{self.src}', daemon=True)
+        self.thread.start()
+        return self
+
+    def update(self):
+        cap = cv2.VideoCapture(self.src)
+        try:
+            if not cap.isOpened():
+                self.error = f'Could not open video source: {self.src}'
+                return
+
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            self.source_fps = fps if 0 < fps < 1000 else None
+            started = time.monotonic()
+            next_sample = 0.0
+            index = -1
+
+            while self.running:
+                if not cap.grab():
+                    break
+                index += 1
+                self.frames_decoded += 1
+
+                # Files are timed by frame index, live streams by the wall clock
+                if self.live or self.source_fps is None:
+                    timestamp = time.monotonic() - started
+                else:
+                    timestamp = index / self.source_fps
+                if self.max_seconds and timestamp > self.max_seconds:
+                    break
+                if timestamp < next_sample:
+                    continue
+                if self.sample_interval:
+                    # Next slot on the sampling grid, skipping any the source has already passed
+                    next_sample = (int(timestamp / self.sample_interval) + 1) * self.sample_interval
+
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                self.put((index, timestamp, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+                self.frames_sampled += 1
+                if self.max_frames and self.frames_sampled >= self.max_frames:
+                    break
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            cap.release()
+            self.put(self.END, force=True)
+
+    def put(self, item, force=False):
+        """Queue an item; `force` makes room even after stop() so the END marker always lands"""
+        while True:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if not self.running and not force:
+                    return
+                if self.live or not self.running:
+                    # Keep the newest frames: drop the oldest queued one
+                    try:
+                        self.queue.get_nowait()
+                        self.frames_dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def read_batch(self, max_items, timeout=None):
+        """Up to max_items sampled frames as (index, timestamp, rgb_frame); [] once the source is exhausted
+
+        Blocks for the first frame only, then takes whatever else is already decoded.
+        """
+        batch = []
+        if self.finished:
+            return batch
+        try:
+            item = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return batch
+        while True:
+            if item is self.END:
+                self.finished = True
+                break
+            batch.append(item)
+            if len(batch) >= max_items:
+                break
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+        return batch
+
+    def stats(self):
+        return {
+            'source_fps': self.source_fps,
+            'frames_decoded': self.frames_decoded,
+            'frames_sampled': self.frames_sampled,
+            'frames_dropped': self.frames_dropped
+        }
+
+    def stop(self):
+        self.running = False
+        if hasattr(self, 'thread'):
+            self.thread.join(timeout=5.0)
+
+
+class DensitySmoother:
+    """Exponential moving average of density maps
+
+    `smoothing` is the weight kept from the previous average (0 disables
+    smoothing, values close to 1 react slowly). The running average is
+    updated in place.
+    """
+
+    def __init__(self, smoothing=0.0):
+        self.alpha = 1.0 - smoothing
+        self.state = None
+
+    def update(self, density_map):
+        if self.state is None or self.state.shape != density_map.shape:
+            self.state = density_map.astype('float32', copy=True)
+        else:
+            cv2.accumulateWeighted(density_map, self.state, self.alpha)
+        return self.state
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from congestion import LEVELS
+
+UNITS = ('pixels', 'normalized')
+# fillPoly fixed-point precision: zone vertices keep 1/16 density-pixel accuracy
+SUBPIXEL_BITS = 4
+
+
+def parse_zone(spec, index):
+    """{'id', 'polygon': [[x, y], ...]} or {'id', 'rect': [x, y, w, h]} -> (id, Nx2 float vertices)"""
+    if not isinstance(spec, dict):
+        raise ValueError(f"Zone {index} must be an object with 'polygon' or 'rect'")
+    zone_id = str(spec.get('id') or spec.get('name') or f'zone_{index}')
+    if 'rect' not in spec and 'polygon' not in spec:
+        raise ValueError(f"Zone '{zone_id}' needs a 'polygon' or a 'rect'")
+
+    try:
+        if 'rect' in spec:
+            x, y, w, h = (float(v) for v in spec['rect'])
+            points = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.float64)
+            valid = w > 0 and h > 0
+        else:
+            points = np.array(spec['polygon'], dtype=np.float64)
+            valid = points.ndim == 2 and points.shape[1] == 2 and len(points) >= 3
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError(f"Zone '{zone_id}': polygon must be 3+ [x, y] points, rect must be [x, y, width, height]")
+    if not np.isfinite(points).all():
+        raise ValueError(f"Zone '{zone_id}' has non-finite coordinates")
+    return zone_id, points
+
+
+class ZoneSet:
+    """Named polygon zones rasterised into label masks at density map resolution
+
+    Zones are drawn once per (image size, density map shape) into integer
+    label layers (0 = outside every zone, i + 1 = zone i); zones that overlap
+    an earlier zone go to another layer, so most zone sets need a single one.
+    Per-zone counts and congestion levels are then one weighted np.bincount
+    per layer. Coordinates are image pixels, or 0-1 fractions with
+    units='normalized'.
+    """
+
+    def __init__(self, zones, units='pixels', max_cached_masks=8):
+        if units not in UNITS:
+            raise ValueError(f"Invalid zone units '{units}', expected one of: {', '.join(UNITS)}")
+        if not zones:
+            raise ValueError('At least one zone is required')
+        self.ids = [zone_id for zone_id, _ in zones]
+        if len(set(self.ids)) != len(self.ids):
+            raise ValueError('Zone ids must be unique')
+        self.polygons = [points for _, points in zones]
+        self.units = units
+
+        canonical = json.dumps(self.to_dict(), sort_keys=True, separators=(',', ':'))
+        self.id = hashlib.blake2b(canonical.encode(), digest_size=8).hexdigest()
+
+        self.max_cached_masks = max_cached_masks
+        self.masks = OrderedDict()  # (image size, density shape) -> (label layers, pixels per zone)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_spec(cls, spec, max_zones=64):
+        """Zone set from a JSON string, a list of zones or {'zones': [...], 'units': ...}"""
+        if isinstance(spec, (str, bytes)):
+            try:
+                spec = json.loads(spec)
+            except json.JSONDecodeError as e:
+                raise ValueError(f'Invalid zones JSON: {e}')
+        units = 'pixels'
+        if isinstance(spec, dict):
+            units = spec.get('units', units)
+            spec = spec.get('zones')
+        if not isinstance(spec, list):
+            raise ValueError("zones must be a list of zone objects (or {'zones': [...], 'units': ...})")
+        if len(spec) > max_zones:
+            raise ValueError(f'At most {max_zones} zones per set')
+        return cls([parse_zone(zone, i) for i, zone in enumerate(spec)], units)
+
+    def to_dict(self):
+        return {
+            'units': self.units,
+            'zones': [{'id': zone_id, 'polygon': points.tolist()} for zone_id, points in zip(self.ids, self.polygons)]
+        }
+
+    def rasterise(self, image_size, density_shape):
+        """Label layers and per-zone pixel counts for one image size, cached"""
+        key = (tuple(image_size), tuple(density_shape))
+        with self.lock:
+            if key in self.masks:
+                self.masks.move_to_end(key)
+                return self.masks[key]
+
+        height, width = density_shape
+        if self.units == 'normalized':
+            scale = np.array([width, height], dtype=np.float64)
+        else:
+            scale = np.array([width / image_size[0], height / image_size[1]], dtype=np.float64)
+
+        layers = []
+        zone_mask = np.empty(density_shape, dtype=np.uint8)
+        for label, points in enumerate(self.polygons, start=1):
+            # Vertices are pixel corners; shift to the pixel-centre convention fillPoly uses
+            vertices = np.round((points * scale - 0.5) * (1 << SUBPIXEL_BITS)).astype(np.int32)
+            zone_mask.fill(0)
+            cv2.fillPoly(zone_mask, [vertices], 1, lineType=cv2.LINE_8, shift=SUBPIXEL_BITS)
+            inside = zone_mask.view(bool)
+            for layer in layers:
+                if not layer[inside].any():
+                    break
+            else:
+                layer = np.zeros(density_shape, dtype=np.int32)
+                layers.append(layer)
+            layer[inside] = label
+
+        pixels = np.zeros(len(self.ids), dtype=np.int64)
+        for layer in layers:
+            pixels += np.bincount(layer.ravel(), minlength=len(self.ids) + 1)[1:]
+        entry = ([layer.ravel() for layer in layers], pixels)
+
+        with self.lock:
+            self.masks[key] = entry
+            while len(self.masks) > self.max_cached_masks:
+                self.masks.popitem(last=False)
+        return entry
+
+    def summarise(self, density_map, image_size, levels=None, min_level_percent=10.0):
+        """Per-zone count, area and (given a CongestionAnalysis level map) congestion breakdown"""
+        layers, pixels = self.rasterise(image_size, density_map.shape)
+        n = len(self.ids)
+        weights = density_map.ravel()
+        counts = np.zeros(n, dtype=np.float64)
+        level_pixels = np.zeros((n, len(LEVELS)), dtype=np.int64) if levels is not None else None
+
+        for labels in layers:
+            counts += np.bincount(labels, weights=weights, minlength=n + 1)[1:]
+            if levels is not None:
+                combined = labels * len(LEVELS) + levels.ravel()
+                level_pixels += np.bincount(combined, minlength=(n + 1) * len(LEVELS)).reshape(n + 1, -1)[1:]
+
+        zones = []
+        for i, zone_id in enumerate(self.ids):
+            zone = {
+                'id': zone_id,
+                'count': round(float(counts[i]), 1),
+                'pixels': int(pixels[i]),
+                'area_percent': round(100 * int(pixels[i]) / density_map.size, 1)
+            }
+            if level_pixels is not None:
+                share = 100 * level_pixels[i] / pixels[i] if pixels[i] else np.zeros(len(LEVELS))
+                # Most severe level covering at least min_level_percent of the zone
+                severe = [level for level, percent in zip(LEVELS, share) if percent >= min_level_percent]
+                zone['congestion_level'] = severe[-1] if severe else LEVELS[0]
+                zone.update({f'{level}_congestion_percent': round(float(percent), 1)
+                             for level, percent in zip(LEVELS, share)})
+            zones.append(zone)
+        return zones
+
+
+class ZoneRegistry:
+    """Zone sets by id, LRU-bounded in memory and optionally persisted as JSON files
+
+    With `store_dir`, definitions registered by one serving process (or
+    before a restart) are loaded from disk on first use by another; the
+    directory keeps the `max_sets` most recently registered files. Ids are
+    content hashes, so registering the same zones twice returns the same
+    ZoneSet (and its cached masks) without writing the file again.
+    """
+
+    def __init__(self, max_sets=256, max_zones=64, store_dir=None):
+        self.max_sets = max_sets
+        self.max_zones = max_zones
+        self.store_dir = store_dir
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+        self.sets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, zone_set_id):
+        # Ids are hex digests; anything else cannot name a stored set
+        if not zone_set_id.isalnum():
+            return None
+        return os.path.join(self.store_dir, f'{zone_set_id}.json')
+
+    def _remember(self, zone_set):
+        with self.lock:
+            self.sets[zone_set.id] = zone_set
+            self.sets.move_to_end(zone_set.id)
+            while len(self.sets) > self.max_sets:
+                self.sets.popitem(last=False)
+        return zone_set
+
+    def register(self, spec):
+        zone_set = ZoneSet.from_spec(spec, self.max_zones)
+        existing = self.get(zone_set.id)
+        if existing is not None:
+            if self.store_dir:
+                try:
+                    os.utime(self._path(zone_set.id))  # re-registered: keep it out of the next prune
+                except FileNotFoundError:
+                    # Pruned by another worker: store it again so every worker can resolve the id
+                    self._write(existing)
+            return existing
+        if self.store_dir:
+            self._write(zone_set)
+        return self._remember(zone_set)
+
+    def _write(self, zone_set):
+        path = self._path(zone_set.id)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(zone_set.to_dict(), f)
+        os.replace(tmp_path, path)
+        self._prune()
+
+    def _prune(self):
+        """Delete the oldest stored definitions beyond max_sets"""
+        stored = []
+        for entry in os.scandir(self.store_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    stored.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass  # removed by another process
+        stored.sort()
+        for _, path in stored[:max(0, len(stored) - self.max_sets)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, zone_set_id):
+        with self.lock:
+            zone_set = self.sets.get(zone_set_id)
+            if zone_set is not None:
+                self.sets.move_to_end(zone_set_id)
+                return zone_set
+        path = self._path(zone_set_id) if self.store_dir else None
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return self._remember(ZoneSet.from_spec(json.load(f), self.max_zones))
+
+    def delete(self, zone_set_id):
+        with self.lock:
+            found = self.sets.pop(zone_set_id, None) is not None
+        path = self._path(zone_set_id) if self.store_dir else None
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+            found = True
+        return found
+
+    def stats(self):
+        with self.lock:
+            return {'zone_sets': len(self.sets), 'max_zone_sets': self.max_sets, 'persisted': bool(self.store_dir)}